@@ -0,0 +1,95 @@
+"""
+Kazi webhook deduplication by Twilio MessageSid.
+
+When a webhook answers late, Twilio retries it with the same MessageSid; a
+retry must not run the pipeline (transcription, quota, LLM, reply) twice.
+`seen_before` answers from an in-process LRU first; on a miss it
+records the sid in kazi_inbound_messages with `ON CONFLICT DO NOTHING`, which
+also catches retries that land on another replica. Rows only have to outlive
+Twilio's retry window, so `prune_loop` deletes them after DEDUP_TTL_SECONDS.
+
+If the database is unavailable the check fails open: a possible duplicate
+is better than dropping a real message.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+import kazi_log
+from kazi_metrics import WEBHOOK_DUPLICATES_TOTAL
+
+log = kazi_log.get_logger("dedup")
+
+# ---------- Env ----------
+DEDUP_CACHE_MAX = int(os.getenv("DEDUP_CACHE_MAX", "20000"))
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", "3600"))
+DEDUP_PRUNE_SECONDS = int(os.getenv("DEDUP_PRUNE_SECONDS", "600"))
+
+# message_sid -> expires_at (monotonic)
+_recent: OrderedDict = OrderedDict()
+_stats = {"checked": 0, "duplicates_memory": 0, "duplicates_db": 0, "db_errors": 0}
+
+
+def _remember(message_sid: str):
+    _recent[message_sid] = time.monotonic() + DEDUP_TTL_SECONDS
+    _recent.move_to_end(message_sid)
+    while len(_recent) > DEDUP_CACHE_MAX:
+        _recent.popitem(last=False)
+
+
+async def seen_before(db_pool, message_sid: str) -> bool:
+    """True if this MessageSid was already accepted (by this or another replica)."""
+    _stats["checked"] += 1
+    expires_at = _recent.get(message_sid)
+    if expires_at is not None and expires_at > time.monotonic():
+        _stats["duplicates_memory"] += 1
+        WEBHOOK_DUPLICATES_TOTAL.inc("memory")
+        return True
+    # Remember before awaiting so a concurrent retry on this process is caught too.
+    _remember(message_sid)
+    if not db_pool:
+        return False
+    try:
+        async with db_pool.acquire() as conn:
+            inserted = await conn.fetchval(
+                """
+                INSERT INTO kazi_inbound_messages (message_sid) VALUES ($1)
+                ON CONFLICT DO NOTHING RETURNING 1
+                """,
+                message_sid,
+            )
+    except Exception as e:
+        _stats["db_errors"] += 1
+        log.error("dedup insert failed for %s: %s", message_sid, e)
+        return False
+    if inserted is None:
+        _stats["duplicates_db"] += 1
+        WEBHOOK_DUPLICATES_TOTAL.inc("db")
+        return True
+    return False
+
+
+async def prune_loop(db_pool):
+    """Background task: drop sids older than DEDUP_TTL_SECONDS."""
+    if not db_pool:
+        return
+    while True:
+        await asyncio.sleep(DEDUP_PRUNE_SECONDS)
+        try:
+            async with db_pool.acquire() as conn:
+                await conn.execute(
+                    "DELETE FROM kazi_inbound_messages WHERE received_at < NOW() - make_interval(secs => $1)",
+                    DEDUP_TTL_SECONDS,
+                )
+        except Exception as e:
+            log.error("dedup prune error: %s", e)
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "duplicates": _stats["duplicates_memory"] + _stats["duplicates_db"],
+        "cached": len(_recent),
+    }
@@ -5,28 +5,63 @@ Core principle: Kazi routes. Products think.
 Kazi does not interpret messages. It looks up the sender's connection,
 passes the raw message to the product's API, and returns the reply.
 
-Tables (Postgres):
+Tables (Postgres, created by kazi_migrations):
   - kazi_connections: whatsapp_number -> (client_id, product, api endpoint, api key)
-  - kazi_scheduled:   cron-like push jobs per connection
+  - kazi_scheduled:   cron-like push jobs per connection, in the connection's timezone
 
 Phase 2: Always On (ao.aifredoapp.com) is the only connected product.
 """
 
 import os
+import time
 import uuid
+import random
 import asyncio
 import httpx
-from datetime import datetime, timezone
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from datetime import datetime, timezone, timedelta
+
+import kazi_http
+import kazi_jobs
+import kazi_log
+import kazi_notify
+import kazi_outbox
+import kazi_stats
+from kazi_metrics import PATH, PRODUCT_CALL_SECONDS, stage
+from kazi_tz import get_zone
+
+log = kazi_log.get_logger("gateway")
 
 # ---------- Env ----------
 ALWAYS_ON_API_ENDPOINT = os.getenv("ALWAYS_ON_API_ENDPOINT", "https://ao.aifredoapp.com")
 ALWAYS_ON_API_KEY = os.getenv("ALWAYS_ON_API_KEY", "")
+CONNECTION_CACHE_TTL_SECONDS = float(os.getenv("CONNECTION_CACHE_TTL_SECONDS", "300"))
+CONNECTION_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("CONNECTION_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+CONNECTION_CACHE_MAX = int(os.getenv("CONNECTION_CACHE_MAX", "50000"))
+GATEWAY_PRODUCT_CONCURRENCY = int(os.getenv("GATEWAY_PRODUCT_CONCURRENCY", "16"))
+GATEWAY_PRODUCT_QUEUE_SIZE = int(os.getenv("GATEWAY_PRODUCT_QUEUE_SIZE", "200"))
+PRODUCT_CALL_TIMEOUT_SECONDS = float(os.getenv("PRODUCT_CALL_TIMEOUT_SECONDS", "30"))
+PRODUCT_CALL_RETRIES = int(os.getenv("PRODUCT_CALL_RETRIES", "1"))
+COALESCE_GATEWAY_MS = int(os.getenv("COALESCE_GATEWAY_MS", "0"))  # 0 = off
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+GATEWAY_RETRY_BACKOFF_SECONDS = float(os.getenv("GATEWAY_RETRY_BACKOFF_SECONDS", "0.5"))
+GATEWAY_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("GATEWAY_RETRY_MAX_BACKOFF_SECONDS", "5"))
+GATEWAY_RETRY_BUDGET_RATIO = float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", "0.1"))  # retries per call
+GATEWAY_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("GATEWAY_RETRY_BUDGET_MIN_PER_SECOND", "0.2"))
+GATEWAY_RETRY_BUDGET_MAX = float(os.getenv("GATEWAY_RETRY_BUDGET_MAX", "10"))
+SCHEDULED_BATCH_SIZE = int(os.getenv("SCHEDULED_BATCH_SIZE", "500"))
+SCHEDULED_CONCURRENCY = int(os.getenv("SCHEDULED_CONCURRENCY", "50"))
+SCHEDULED_GRACE_MINUTES = int(os.getenv("SCHEDULED_GRACE_MINUTES", "30"))
+SCHEDULED_CLAIM_SLACK_SECONDS = int(os.getenv("SCHEDULED_CLAIM_SLACK_SECONDS", "60"))
 
 # Fallback messages (per spec)
 MSG_NOT_CONNECTED = "To connect your account, log into ao.aifredoapp.com and scan the QR code in Admin."
 MSG_TIMEOUT = "Fred is taking longer than usual. Try again or visit ao.aifredoapp.com."
 MSG_DOWN = "Something went wrong. Try again or visit ao.aifredoapp.com."
 MSG_UNKNOWN = "I ran into an issue. Please try again in a moment."
+MSG_BUSY = "Fred is handling a lot of requests right now. Please try again in a minute."
 MSG_LINKED = (
     "You're connected to Always On ✓\n\n"
     "You can now message me here anytime. Try:\n"
@@ -40,53 +75,108 @@ MSG_LINK_BAD_TOKEN = "❌ That link code didn't work — it may have expired. Go
 ACK_MESSAGE = "..."
 
 
-# ---------- Schema ----------
-async def init_gateway_schema(db_pool):
-    """Create the two Kazi gateway tables if they don't exist (Postgres)."""
-    if not db_pool:
+# ---------- Connection cache ----------
+# whatsapp_number -> (expires_at, connection dict or None). None caches "not linked",
+# which is the answer for most senders. LRU-bounded at CONNECTION_CACHE_MAX.
+# Writes invalidate locally and NOTIFY kazi_connections so other replicas drop
+# their copy; the cache is only consulted while that LISTEN connection is up.
+CONNECTIONS_CHANNEL = "kazi_connections"
+_connection_cache: OrderedDict = OrderedDict()
+_cache_live = False
+_cache_epoch = 0  # bumped on every invalidation so in-flight misses don't cache stale rows
+_cache_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def _cache_get(whatsapp_number: str):
+    """Return (found, connection). `found` is False on a miss or an expired entry."""
+    if not _cache_live:
+        return False, None
+    entry = _connection_cache.get(whatsapp_number)
+    if entry is None:
+        return False, None
+    expires_at, connection = entry
+    if expires_at < time.monotonic():
+        del _connection_cache[whatsapp_number]
+        return False, None
+    _connection_cache.move_to_end(whatsapp_number)
+    return True, connection
+
+
+def _cache_put(whatsapp_number: str, connection, epoch: int):
+    if not _cache_live or epoch != _cache_epoch:
         return
-    async with db_pool.acquire() as conn:
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS kazi_connections (
-                id                   TEXT PRIMARY KEY,
-                whatsapp_number      TEXT UNIQUE NOT NULL,
-                client_id            TEXT NOT NULL,
-                product              TEXT NOT NULL,
-                product_api_endpoint TEXT NOT NULL,
-                product_api_key      TEXT NOT NULL,
-                linked_at            TIMESTAMPTZ DEFAULT NOW(),
-                last_active          TIMESTAMPTZ
-            )
-            """
-        )
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS kazi_scheduled (
-                id                   TEXT PRIMARY KEY,
-                whatsapp_number      TEXT NOT NULL,
-                product              TEXT NOT NULL,
-                client_id            TEXT NOT NULL,
-                schedule             TEXT NOT NULL,   -- 'HH:MM'
-                days_of_week         TEXT DEFAULT '1,2,3,4,5', -- ISO weekday, 1=Mon..7=Sun
-                message_type         TEXT NOT NULL,   -- e.g. 'daily_digest', 'weekly_report'
-                active               BOOLEAN DEFAULT TRUE,
-                last_sent            TIMESTAMPTZ
-            )
-            """
-        )
+    ttl = CONNECTION_CACHE_TTL_SECONDS if connection else CONNECTION_CACHE_NEGATIVE_TTL_SECONDS
+    _connection_cache[whatsapp_number] = (time.monotonic() + ttl, connection)
+    _connection_cache.move_to_end(whatsapp_number)
+    while len(_connection_cache) > CONNECTION_CACHE_MAX:
+        _connection_cache.popitem(last=False)
+        _cache_stats["evictions"] += 1
+
+
+def invalidate_connection(whatsapp_number: str):
+    global _cache_epoch
+    _cache_epoch += 1
+    if _connection_cache.pop(whatsapp_number, None) is not None:
+        _cache_stats["invalidations"] += 1
+
+
+async def _notify_connection_changed(conn, whatsapp_number: str):
+    invalidate_connection(whatsapp_number)
+    await conn.execute("SELECT pg_notify($1, $2)", CONNECTIONS_CHANNEL, whatsapp_number)
+
+
+def _on_connection_notify(conn, pid, channel, payload):
+    invalidate_connection(payload)
+
+
+# The cache is enabled only while kazi_notify's LISTEN connection is attached;
+# if it drops, the cache is cleared and lookups go to the DB until it reconnects.
+def _on_listen_connected():
+    global _cache_live
+    _cache_live = True
+
+
+def _on_listen_lost():
+    global _cache_live
+    _cache_live = False
+    _connection_cache.clear()
+
+
+kazi_notify.subscribe(
+    CONNECTIONS_CHANNEL, _on_connection_notify, on_connect=_on_listen_connected, on_lost=_on_listen_lost
+)
+
+
+def connection_cache_stats() -> dict:
+    lookups = _cache_stats["hits"] + _cache_stats["negative_hits"] + _cache_stats["misses"]
+    hit_rate = (_cache_stats["hits"] + _cache_stats["negative_hits"]) / lookups if lookups else 0.0
+    return {
+        **_cache_stats,
+        "live": _cache_live,
+        "size": len(_connection_cache),
+        "hit_rate": round(hit_rate, 4),
+    }
 
 
 # ---------- Connection lookup ----------
 async def get_connection(db_pool, whatsapp_number: str):
     if not db_pool:
         return None
-    async with db_pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT * FROM kazi_connections WHERE whatsapp_number = $1",
-            whatsapp_number,
-        )
-        return dict(row) if row else None
+    found, connection = _cache_get(whatsapp_number)
+    if found:
+        _cache_stats["hits" if connection else "negative_hits"] += 1
+        return connection
+    _cache_stats["misses"] += 1
+    epoch = _cache_epoch
+    with stage("get_connection"):
+        async with db_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT * FROM kazi_connections WHERE whatsapp_number = $1",
+                whatsapp_number,
+            )
+    connection = dict(row) if row else None
+    _cache_put(whatsapp_number, connection, epoch)
+    return connection
 
 
 async def upsert_connection(
@@ -96,22 +186,25 @@ async def upsert_connection(
     product: str,
     product_api_endpoint: str,
     product_api_key: str,
+    tz_name: str = None,
 ):
+    """Store the link. `tz_name` (IANA) drives scheduled pushes; None keeps the current one."""
     if not db_pool:
         return None
     async with db_pool.acquire() as conn:
         await conn.execute(
             """
             INSERT INTO kazi_connections
-                (id, whatsapp_number, client_id, product, product_api_endpoint, product_api_key, linked_at, last_active)
-            VALUES ($1, $2, $3, $4, $5, $6, NOW(), NOW())
+                (id, whatsapp_number, client_id, product, product_api_endpoint, product_api_key, linked_at, last_active, timezone)
+            VALUES ($1, $2, $3, $4, $5, $6, NOW(), NOW(), COALESCE($7, 'UTC'))
             ON CONFLICT (whatsapp_number)
             DO UPDATE SET
                 client_id            = EXCLUDED.client_id,
                 product              = EXCLUDED.product,
                 product_api_endpoint = EXCLUDED.product_api_endpoint,
                 product_api_key      = EXCLUDED.product_api_key,
-                last_active          = NOW()
+                last_active          = NOW(),
+                timezone             = COALESCE($7, kazi_connections.timezone)
             """,
             str(uuid.uuid4()),
             whatsapp_number,
@@ -119,7 +212,15 @@ async def upsert_connection(
             product,
             product_api_endpoint,
             product_api_key,
+            tz_name,
         )
+        if tz_name:
+            # Re-anchor existing schedules to the new timezone on the next tick.
+            await conn.execute(
+                "UPDATE kazi_scheduled SET next_run_at = NULL WHERE whatsapp_number = $1",
+                whatsapp_number,
+            )
+        await _notify_connection_changed(conn, whatsapp_number)
 
 
 async def touch_connection(db_pool, whatsapp_number: str):
@@ -140,31 +241,160 @@ async def delete_connection(db_pool, whatsapp_number: str):
             "DELETE FROM kazi_connections WHERE whatsapp_number = $1",
             whatsapp_number,
         )
+        await _notify_connection_changed(conn, whatsapp_number)
+
+
+# ---------- Circuit breaker + retry budget ----------
+# One breaker per product origin. Several tenants can share an origin (every
+# Always On client URL does), so only signs that the origin itself is in
+# trouble count as failures: timeouts, connection errors, 429, and the
+# 502/503/504 a proxy returns when the app behind it is down. Any other 5xx
+# means the app answered and one tenant's handler failed, so it is retried
+# but counts as a success. BREAKER_FAILURE_THRESHOLD consecutive failures open the
+# breaker; while open, calls fail immediately with CircuitOpenError instead of
+# tying up a socket and a worker for up to a full timeout. After
+# BREAKER_OPEN_SECONDS one probe call is let through (half-open): success
+# closes the breaker, failure re-opens it.
+# Retries draw on a process-wide budget (GATEWAY_RETRY_BUDGET_RATIO of calls,
+# plus a small floor), so a degraded product can't double the load on itself.
+BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN = "closed", "half_open", "open"
+ORIGIN_FAILURE_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        if self.state == BREAKER_OPEN:
+            if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS:
+                self.stats["rejected"] += 1
+                return False
+            self.state = BREAKER_HALF_OPEN
+            self.probing = False
+        if self.state == BREAKER_HALF_OPEN:
+            if self.probing:
+                self.stats["rejected"] += 1
+                return False
+            self.probing = True
+        return True
+
+    def record_success(self):
+        if self.state != BREAKER_CLOSED:
+            log.info("circuit for %s closed", self.name)
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN or self.failures >= BREAKER_FAILURE_THRESHOLD:
+            if self.state != BREAKER_OPEN:
+                self.stats["opened"] += 1
+                log.warning("circuit for %s opened after %d failures", self.name, self.failures)
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+_breakers: dict = {}
+_retry_budget = {"tokens": GATEWAY_RETRY_BUDGET_MAX, "updated": time.monotonic()}
+_retry_stats = {"retries": 0, "budget_exhausted": 0}
+
+
+def _breaker_for(url: str) -> CircuitBreaker:
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    breaker = _breakers.get(origin)
+    if breaker is None:
+        breaker = _breakers[origin] = CircuitBreaker(origin)
+    return breaker
+
+
+def _deposit_retry_budget():
+    now = time.monotonic()
+    refill = (now - _retry_budget["updated"]) * GATEWAY_RETRY_BUDGET_MIN_PER_SECOND
+    _retry_budget["tokens"] = min(
+        GATEWAY_RETRY_BUDGET_MAX, _retry_budget["tokens"] + refill + GATEWAY_RETRY_BUDGET_RATIO
+    )
+    _retry_budget["updated"] = now
+
+
+def _withdraw_retry_budget() -> bool:
+    if _retry_budget["tokens"] < 1:
+        _retry_stats["budget_exhausted"] += 1
+        return False
+    _retry_budget["tokens"] -= 1
+    _retry_stats["retries"] += 1
+    return True
+
+
+def breaker_stats() -> dict:
+    return {
+        "breakers": {
+            name: {"state": b.state, "failures": b.failures, **b.stats} for name, b in _breakers.items()
+        },
+        "retry_budget_tokens": round(_retry_budget["tokens"], 2),
+        **_retry_stats,
+    }
 
 
-# ---------- HTTP w/ retry ----------
 async def _post_with_retry(url: str, headers: dict, json_body: dict,
                            timeout_seconds: float = 30.0, retries: int = 1):
-    """POST once, retry once on non-2xx or exception, 5s between attempts."""
-    last_error = None
-    for attempt in range(retries + 1):
+    """
+    POST through the origin's circuit breaker. Retries 429/5xx and network
+    errors up to `retries` times with jittered exponential backoff, if the
+    retry budget allows. Timeouts and other 4xx are not retried. Only
+    timeouts, network errors and ORIGIN_FAILURE_STATUSES count against the
+    breaker.
+    Raises CircuitOpenError without calling out while the breaker is open.
+    """
+    breaker = _breaker_for(url)
+    _deposit_retry_budget()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit open for {breaker.name}")
         try:
-            async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-                resp = await client.post(url, headers=headers, json=json_body)
-            if resp.status_code < 400:
-                return resp
-            last_error = RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
-        except httpx.TimeoutException as e:
-            last_error = e
+            resp = await kazi_http.client_for(url).post(
+                url, headers=headers, json=json_body, timeout=timeout_seconds
+            )
+        except asyncio.CancelledError:
+            breaker.probing = False  # don't leave a half-open breaker waiting on a dead probe
+            raise
+        except httpx.TimeoutException:
+            breaker.record_failure()
             # Timeout is fatal for this flow — don't retry, let caller surface MSG_TIMEOUT
             raise
         except Exception as e:
-            last_error = e
-        if attempt < retries:
-            await asyncio.sleep(5)
-    if last_error:
-        raise last_error
-    return None
+            breaker.record_failure()
+            error = e
+        else:
+            if resp.status_code < 400:
+                breaker.record_success()
+                return resp
+            error = RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+            if resp.status_code in ORIGIN_FAILURE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # the origin answered; this request or tenant failed
+                if resp.status_code < 500:
+                    raise error
+        if attempt >= retries or not _withdraw_retry_budget():
+            raise error
+        attempt += 1
+        await asyncio.sleep(
+            random.uniform(0, min(GATEWAY_RETRY_MAX_BACKOFF_SECONDS, GATEWAY_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+        )
 
 
 # ---------- Linking: CONNECT-<token> ----------
@@ -185,27 +415,27 @@ async def verify_token_with_always_on(token: str, whatsapp_number: str):
     Returns dict like {"clientId": "..."} on success, or None.
     """
     if not ALWAYS_ON_API_KEY:
-        print(f"[GATEWAY] ALWAYS_ON_API_KEY not set — cannot verify token")
+        log.error("ALWAYS_ON_API_KEY not set — cannot verify token")
         return None
     url = f"{ALWAYS_ON_API_ENDPOINT.rstrip('/')}/api/kazi/verify-ao-token"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {ALWAYS_ON_API_KEY}",
     }
-    print(f"[GATEWAY] Calling Always On verify-token endpoint: {url}")
+    log.info("calling Always On verify-token endpoint: %s", url)
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(
-                url,
-                headers=headers,
-                json={"token": token, "whatsappNumber": whatsapp_number},
-            )
-        print(f"[GATEWAY] verify-ao-token response: HTTP {resp.status_code}")
+        resp = await kazi_http.client_for(url).post(
+            url,
+            headers=headers,
+            json={"token": token, "whatsappNumber": whatsapp_number},
+            timeout=15.0,
+        )
+        log.info("verify-ao-token response: HTTP %s", resp.status_code)
         if resp.status_code == 200:
             return resp.json()
-        print(f"[GATEWAY] verify-ao-token error body: {resp.text[:200]}")
+        log.warning("verify-ao-token error body: %s", resp.text[:200])
     except Exception as e:
-        print(f"[GATEWAY] verify-ao-token exception: {e}")
+        log.error("verify-ao-token exception: %s", e)
     return None
 
 
@@ -214,14 +444,14 @@ async def handle_connect_message(db_pool, whatsapp_number: str, token: str) -> s
     Called when an incoming message is `CONNECT-<token>`.
     Verifies with Always On, stores the connection, returns the reply to send.
     """
-    print(f"[GATEWAY] CONNECT token received from {whatsapp_number}")
+    log.info("CONNECT token received from %s", whatsapp_number)
     result = await verify_token_with_always_on(token, whatsapp_number)
     if not result or not result.get("clientId"):
-        print(f"[GATEWAY] Token verification failed for {whatsapp_number}")
+        log.warning("token verification failed for %s", whatsapp_number)
         return MSG_LINK_BAD_TOKEN
 
     client_id = result["clientId"]
-    print(f"[GATEWAY] Token verified — client_id: {client_id}, name: {result.get('name', '?')}")
+    log.info("token verified — client_id: %s, name: %s", client_id, result.get("name", "?"))
     await upsert_connection(
         db_pool,
         whatsapp_number=whatsapp_number,
@@ -229,8 +459,9 @@ async def handle_connect_message(db_pool, whatsapp_number: str, token: str) -> s
         product="Always On",
         product_api_endpoint=ALWAYS_ON_API_ENDPOINT,
         product_api_key=ALWAYS_ON_API_KEY,
+        tz_name=result.get("timezone") if get_zone(result.get("timezone") or "") else None,
     )
-    print(f"[GATEWAY] Connection stored for {whatsapp_number}")
+    log.info("connection stored for %s", whatsapp_number)
     return MSG_LINKED
 
 
@@ -253,12 +484,24 @@ async def call_product_message(connection: dict, message: str,
         "channel": channel,
         "whatsappNumber": whatsapp_number,
     }
-    resp = await _post_with_retry(url, headers, body, timeout_seconds=30.0, retries=1)
-    data = resp.json()
-    reply = data.get("reply")
-    if not reply:
-        raise RuntimeError("Product returned no reply")
-    return reply
+    kazi_stats.bump("gateway_calls")
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with stage("product_call"):
+            resp = await _post_with_retry(
+                url, headers, body, timeout_seconds=PRODUCT_CALL_TIMEOUT_SECONDS, retries=PRODUCT_CALL_RETRIES
+            )
+        data = resp.json()
+        reply = data.get("reply")
+        if not reply:
+            raise RuntimeError("Product returned no reply")
+        outcome = "ok"
+        return reply
+    finally:
+        PRODUCT_CALL_SECONDS.observe(
+            time.perf_counter() - started, connection.get("product") or "unknown", outcome
+        )
 
 
 async def process_and_reply(db_pool, send_whatsapp, whatsapp_number: str,
@@ -267,51 +510,227 @@ async def process_and_reply(db_pool, send_whatsapp, whatsapp_number: str,
     Async worker: calls product, then sends Fred's real reply as a second
     WhatsApp message. Sends a fallback on error.
     """
-    print(f"[GATEWAY] Routing {whatsapp_number} to {connection.get('product', '?')} client {connection.get('client_id', '?')}")
+    PATH.set("gateway")
+    log.info(
+        "routing %s to %s client %s", whatsapp_number,
+        connection.get("product", "?"), connection.get("client_id", "?"), extra=kazi_log.sample(0.1),
+    )
     try:
         reply = await call_product_message(connection, message, whatsapp_number)
-        print(f"[GATEWAY] Reply received, sending to WhatsApp")
+        log.debug("reply received, sending to WhatsApp")
         await send_whatsapp(whatsapp_number, reply)
         await touch_connection(db_pool, whatsapp_number)
+    except CircuitOpenError as e:
+        log.info("product down for %s: %s", whatsapp_number, e, extra=kazi_log.sample(0.1))
+        await send_whatsapp(whatsapp_number, MSG_DOWN)
     except httpx.TimeoutException:
-        print(f"[GATEWAY] Timeout calling product for {whatsapp_number}")
+        log.warning("timeout calling product for %s", whatsapp_number)
         await send_whatsapp(whatsapp_number, MSG_TIMEOUT)
     except httpx.HTTPError as e:
-        print(f"[GATEWAY] HTTP error calling product for {whatsapp_number}: {e}")
+        log.warning("HTTP error calling product for %s: %s", whatsapp_number, e)
         await send_whatsapp(whatsapp_number, MSG_DOWN)
     except Exception as e:
-        print(f"[GATEWAY] process_and_reply error for {whatsapp_number}: {e}")
+        log.error("process_and_reply error for %s: %s", whatsapp_number, e, exc_info=True)
         await send_whatsapp(whatsapp_number, MSG_UNKNOWN)
 
 
-# ---------- Scheduled push messages ----------
-async def run_scheduled_messages(db_pool, send_whatsapp):
+# ---------- Supervised routing ----------
+# One bounded JobQueue per product: at most GATEWAY_PRODUCT_CONCURRENCY product
+# calls in flight and GATEWAY_PRODUCT_QUEUE_SIZE waiting. The queue holds every
+# task reference (nothing is fire-and-forget) and is drained on shutdown.
+# Per-number mailboxes in front of it keep each sender's replies in order.
+_product_mailboxes: dict = {}
+
+
+def _mailboxes_for(product: str) -> kazi_jobs.Mailboxes:
+    boxes = _product_mailboxes.get(product)
+    if boxes is None:
+        queue = kazi_jobs.JobQueue(
+            f"gateway:{product}", GATEWAY_PRODUCT_CONCURRENCY, GATEWAY_PRODUCT_QUEUE_SIZE
+        )
+        queue.start()
+        boxes = kazi_jobs.Mailboxes(queue)
+        _product_mailboxes[product] = boxes
+    return boxes
+
+
+def submit_reply(db_pool, send_whatsapp, whatsapp_number: str,
+                 message: str, connection: dict) -> bool:
     """
-    Tick the scheduler once. Call product for each due job, push via WhatsApp.
-    Uses Postgres clock; schedule column is 'HH:MM' in UTC.
-    (If you need per-client timezones later, extend the table with a tz column.)
+    Queue process_and_reply under the connection's product limit, after any
+    earlier message from the same number. Returns False when the product's
+    queue (or this sender's backlog) is full; the caller should send MSG_BUSY.
     """
-    if not db_pool:
+    boxes = _mailboxes_for(connection.get("product") or "unknown")
+    accepted = boxes.post(
+        whatsapp_number,
+        process_and_reply, db_pool, send_whatsapp, whatsapp_number, message, connection,
+    )
+    if not accepted:
+        log.warning("%s queue full — rejecting message from %s", boxes.queue.name, whatsapp_number)
+    return accepted
+
+
+async def _flush_coalesced(whatsapp_number: str, messages: list, context):
+    db_pool, send_whatsapp, connection = context
+    if not submit_reply(db_pool, send_whatsapp, whatsapp_number, "\n".join(messages), connection):
+        await send_whatsapp(whatsapp_number, MSG_BUSY)
+
+
+_coalescer = kazi_jobs.Coalescer("gateway", COALESCE_GATEWAY_MS, _flush_coalesced)
+
+
+async def route_message(db_pool, send_whatsapp, whatsapp_number: str,
+                        message: str, connection: dict):
+    """
+    Hand a linked sender's message to their product and ack it.
+    With COALESCE_GATEWAY_MS set, a burst of messages is merged into one
+    product call and acked once.
+    """
+    if _coalescer.enabled:
+        if _coalescer.add(whatsapp_number, message, (db_pool, send_whatsapp, connection)):
+            await send_whatsapp(whatsapp_number, ACK_MESSAGE)
         return
+    if submit_reply(db_pool, send_whatsapp, whatsapp_number, message, connection):
+        # Ack immediately so the user sees something while the product thinks
+        await send_whatsapp(whatsapp_number, ACK_MESSAGE)
+    else:
+        await send_whatsapp(whatsapp_number, MSG_BUSY)
+
+
+async def drain_routing(timeout: float = 25.0):
+    """Let in-flight and queued product calls finish (up to `timeout`) before shutdown."""
+    await _coalescer.flush_all()
+    queues = [boxes.queue for boxes in _product_mailboxes.values()]
+    _product_mailboxes.clear()
+    await asyncio.gather(*(q.drain(timeout) for q in queues))
+
+
+def routing_stats() -> dict:
+    return {
+        "coalescing": _coalescer.stats(),
+        "circuit": breaker_stats(),
+        "products": {
+            name: {**boxes.queue.stats(), "mailboxes": boxes.stats()}
+            for name, boxes in _product_mailboxes.items()
+        },
+    }
+
+
+# ---------- Scheduled push messages ----------
+# Each job carries a precomputed next_run_at (indexed), so finding due work is
+# a range scan instead of matching HH:MM strings. 'HH:MM' and days_of_week are
+# read in the connection's timezone; DST is handled by resolving each
+# occurrence through ZoneInfo. A due job is leased (claimed_until) from the
+# moment it is claimed for as long as its batch can take, and next_run_at only
+# advances in the transaction that queues its message, so a failed call or a
+# crash is retried on later ticks until it falls outside SCHEDULED_GRACE_MINUTES.
+def next_run_after(schedule: str, days_of_week: str, tz_name: str, after: datetime):
+    """First UTC instant strictly after `after` matching 'HH:MM' on one of the ISO weekdays."""
+    hour, minute = (int(part) for part in schedule.split(":"))
+    days = {int(d) for d in (days_of_week or "").split(",") if d.strip().isdigit()} or set(range(1, 8))
+    tz = get_zone(tz_name or "UTC") or timezone.utc
+    local_day = after.astimezone(tz).date()
+    for offset in range(8):
+        day = local_day + timedelta(days=offset)
+        if day.isoweekday() not in days:
+            continue
+        # A wall time inside a spring-forward gap resolves to just after the jump;
+        # an ambiguous fall-back time resolves to its first occurrence (fold=0).
+        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+        candidate = candidate.astimezone(timezone.utc)
+        if candidate > after:
+            return candidate
+    return None
+
+
+def _scheduled_lease(jobs: int) -> timedelta:
+    """Worst-case time to generate `jobs` messages SCHEDULED_CONCURRENCY at a time, plus slack."""
+    rounds = -(-jobs // SCHEDULED_CONCURRENCY)
+    call = (PRODUCT_CALL_RETRIES + 1) * PRODUCT_CALL_TIMEOUT_SECONDS
+    call += PRODUCT_CALL_RETRIES * GATEWAY_RETRY_MAX_BACKOFF_SECONDS
+    return timedelta(seconds=rounds * call + SCHEDULED_CLAIM_SLACK_SECONDS)
+
+
+async def _claim_scheduled_batch(db_pool, skip: list):
+    """
+    Lock one batch of due (or never-scheduled) jobs, leaving out the ids in
+    `skip`. Jobs due within the grace period are leased for as long as the
+    batch can take and returned as (job, next_run_at after this one); new,
+    missed and unparseable jobs just have their next_run_at advanced.
+    """
+    grace = timedelta(minutes=SCHEDULED_GRACE_MINUTES)
+    now = datetime.now(timezone.utc)
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
-            SELECT s.*, c.product_api_endpoint, c.product_api_key
-            FROM kazi_scheduled s
-            JOIN kazi_connections c ON c.whatsapp_number = s.whatsapp_number
-            WHERE s.active = TRUE
-              AND to_char(NOW() AT TIME ZONE 'UTC', 'HH24:MI') = s.schedule
-              AND position(to_char(NOW() AT TIME ZONE 'UTC', 'ID') IN s.days_of_week) > 0
-              AND (s.last_sent IS NULL OR s.last_sent < NOW() - INTERVAL '23 hours')
-            """
-        )
+        async with conn.transaction():
+            rows = await conn.fetch(
+                """
+                SELECT s.id, s.whatsapp_number, s.client_id, s.schedule, s.days_of_week,
+                       s.message_type, s.next_run_at,
+                       c.product, c.product_api_endpoint, c.product_api_key, c.timezone
+                FROM kazi_scheduled s
+                JOIN kazi_connections c ON c.whatsapp_number = s.whatsapp_number
+                WHERE s.active = TRUE
+                  AND (s.next_run_at <= $1 OR s.next_run_at IS NULL)
+                  AND (s.claimed_until IS NULL OR s.claimed_until < $1)
+                  AND s.id <> ALL($3::text[])
+                ORDER BY s.next_run_at NULLS FIRST
+                LIMIT $2
+                FOR UPDATE OF s SKIP LOCKED
+                """,
+                now,
+                SCHEDULED_BATCH_SIZE,
+                skip,
+            )
+            if not rows:
+                return [], 0
+            ids, next_runs, due = [], [], []
+            for job in rows:
+                try:
+                    next_run = next_run_after(job["schedule"], job["days_of_week"], job["timezone"], now)
+                except ValueError:
+                    log.warning("scheduled job %s has bad schedule %r", job["id"], job["schedule"])
+                    next_run = None
+                if job["next_run_at"] is not None and now - job["next_run_at"] <= grace:
+                    due.append((job, next_run))
+                    continue
+                if job["next_run_at"] is not None:
+                    log.warning("scheduled job %s missed its %s window — skipping", job["id"], job["next_run_at"])
+                ids.append(job["id"])
+                next_runs.append(next_run)
+            if ids:
+                # Unparseable schedules get next_run_at NULL and active FALSE so they stop cycling.
+                await conn.execute(
+                    """
+                    UPDATE kazi_scheduled s
+                    SET next_run_at = u.next_run_at,
+                        claimed_until = NULL,
+                        active = s.active AND u.next_run_at IS NOT NULL
+                    FROM unnest($1::text[], $2::timestamptz[]) AS u(id, next_run_at)
+                    WHERE s.id = u.id
+                    """,
+                    ids,
+                    next_runs,
+                )
+            if due:
+                await conn.execute(
+                    "UPDATE kazi_scheduled SET claimed_until = $2 WHERE id = ANY($1::text[])",
+                    [job["id"] for job, _ in due],
+                    now + _scheduled_lease(len(due)),
+                )
+    return due, len(rows)
+
 
-    for job in rows:
-        connection = {
-            "product_api_endpoint": job["product_api_endpoint"],
-            "product_api_key": job["product_api_key"],
-            "client_id": job["client_id"],
-        }
+async def _generate_scheduled(job, slots: asyncio.Semaphore):
+    """Ask the product for the job's message. Returns (reply or None on failure, request id)."""
+    connection = {
+        "product": job["product"],
+        "product_api_endpoint": job["product_api_endpoint"],
+        "product_api_key": job["product_api_key"],
+        "client_id": job["client_id"],
+    }
+    request_id = kazi_log.new_request_id()
+    async with slots:
         try:
             reply = await call_product_message(
                 connection,
@@ -319,34 +738,97 @@ async def run_scheduled_messages(db_pool, send_whatsapp):
                 whatsapp_number=job["whatsapp_number"],
                 channel="scheduled",
             )
-            await send_whatsapp(job["whatsapp_number"], reply)
+        except Exception as e:
+            log.error("scheduled job %s failed, will retry: %s", job["id"], e)
+            reply = None
+    return reply, request_id
+
+
+async def _queue_scheduled(db_pool, ready: list):
+    """Queue generated messages and advance their jobs' next_run_at in one transaction."""
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                UPDATE kazi_scheduled s
+                SET last_sent = NOW(),
+                    next_run_at = u.next_run_at,
+                    claimed_until = NULL,
+                    active = s.active AND u.next_run_at IS NOT NULL
+                FROM unnest($1::text[], $2::timestamptz[]) AS u(id, next_run_at)
+                WHERE s.id = u.id
+                """,
+                [job["id"] for job, _, _, _ in ready],
+                [next_run for _, next_run, _, _ in ready],
+            )
+            await kazi_outbox.enqueue_many(
+                conn,
+                [job["whatsapp_number"] for job, _, _, _ in ready],
+                [reply for _, _, reply, _ in ready],
+                "scheduled",
+                [job["next_run_at"] for job, _, _, _ in ready],
+                [request_id for _, _, _, request_id in ready],
+            )
+    kazi_outbox.wake()
+
+
+async def run_scheduled_messages(db_pool):
+    """
+    Tick the scheduler once: claim due jobs batch by batch and call the
+    product with at most SCHEDULED_CONCURRENCY jobs in flight. Each batch's
+    replies go to the outbox in the same transaction that advances their
+    next_run_at. Failed jobs are skipped for the rest of the tick and released
+    at its end, so the next tick retries them.
+    """
+    if not db_pool:
+        return
+    PATH.set("scheduled")
+    slots = asyncio.Semaphore(SCHEDULED_CONCURRENCY)
+    failed = []
+    try:
+        while True:
+            due, claimed = await _claim_scheduled_batch(db_pool, failed)
+            if due:
+                replies = await asyncio.gather(*(_generate_scheduled(job, slots) for job, _ in due))
+                ready = []
+                for (job, next_run), (reply, request_id) in zip(due, replies):
+                    if reply is None:
+                        failed.append(job["id"])
+                    else:
+                        ready.append((job, next_run, reply, request_id))
+                if ready:
+                    await _queue_scheduled(db_pool, ready)
+                log.info("scheduled: queued %d/%d", len(ready), len(due))
+            if claimed < SCHEDULED_BATCH_SIZE:
+                break
+    finally:
+        if failed:
             async with db_pool.acquire() as conn:
                 await conn.execute(
-                    "UPDATE kazi_scheduled SET last_sent = NOW() WHERE id = $1",
-                    job["id"],
+                    "UPDATE kazi_scheduled SET claimed_until = NULL WHERE id = ANY($1::text[])", failed
                 )
-        except Exception as e:
-            print(f"[Kazi] scheduled job {job['id']} failed: {e}")
 
 
-async def scheduled_loop(db_pool, send_whatsapp, interval_seconds: int = 60):
-    """Background task: runs scheduled messages every minute."""
-    print("[Kazi] scheduled loop started")
+async def scheduled_loop(db_pool, interval_seconds: int = 60):
+    """Background task: runs scheduled messages at the top of every minute."""
+    log.info("scheduled loop started")
     while True:
         try:
-            await run_scheduled_messages(db_pool, send_whatsapp)
+            await run_scheduled_messages(db_pool)
         except Exception as e:
-            print(f"[Kazi] scheduled_loop tick error: {e}")
-        await asyncio.sleep(interval_seconds)
+            log.error("scheduled_loop tick error: %s", e, exc_info=True)
+        now = time.time()
+        await asyncio.sleep(interval_seconds - now % interval_seconds + 0.5)
 
 
 # ---------- Default schedule helper ----------
 async def install_default_schedules(db_pool, whatsapp_number: str, client_id: str):
     """
     On link, install the Always On default schedules for this connection:
-      - Daily digest:   08:00 UTC, Mon-Fri
-      - Weekly report:  09:00 UTC, Monday
-    Idempotent per (whatsapp_number, message_type).
+      - Daily digest:   08:00, Mon-Fri
+      - Weekly report:  09:00, Monday
+    in the connection's timezone (UTC unless set). Idempotent per
+    (whatsapp_number, message_type).
     """
     if not db_pool:
         return
@@ -354,7 +836,12 @@ async def install_default_schedules(db_pool, whatsapp_number: str, client_id: st
         ("daily_digest", "08:00", "1,2,3,4,5"),
         ("weekly_report", "09:00", "1"),
     ]
+    now = datetime.now(timezone.utc)
     async with db_pool.acquire() as conn:
+        tz_name = await conn.fetchval(
+            "SELECT timezone FROM kazi_connections WHERE whatsapp_number = $1",
+            whatsapp_number,
+        )
         for mtype, schedule, dow in defaults:
             existing = await conn.fetchval(
                 "SELECT id FROM kazi_scheduled WHERE whatsapp_number = $1 AND message_type = $2",
@@ -366,8 +853,8 @@ async def install_default_schedules(db_pool, whatsapp_number: str, client_id: st
             await conn.execute(
                 """
                 INSERT INTO kazi_scheduled
-                    (id, whatsapp_number, product, client_id, schedule, days_of_week, message_type, active)
-                VALUES ($1, $2, 'Always On', $3, $4, $5, $6, TRUE)
+                    (id, whatsapp_number, product, client_id, schedule, days_of_week, message_type, active, next_run_at)
+                VALUES ($1, $2, 'Always On', $3, $4, $5, $6, TRUE, $7)
                 """,
                 str(uuid.uuid4()),
                 whatsapp_number,
@@ -375,4 +862,5 @@ async def install_default_schedules(db_pool, whatsapp_number: str, client_id: st
                 schedule,
                 dow,
                 mtype,
+                next_run_after(schedule, dow, tz_name, now),
             )
@@ -0,0 +1,78 @@
+"""
+Kazi shared HTTP clients — one keep-alive pool per upstream host.
+
+Every outbound call (Twilio, Always On, AiFredo) goes through `client_for(url)`
+instead of building its own `httpx.AsyncClient`, so repeated calls to the same
+host reuse an open TCP+TLS connection instead of paying a fresh handshake.
+
+Clients are created lazily on first use and closed in `close_clients()`,
+which `main.lifespan` calls on shutdown.
+"""
+
+import os
+import httpx
+from urllib.parse import urlsplit
+
+import kazi_log
+
+log = kazi_log.get_logger("http")
+
+# ---------- Env ----------
+HTTP_MAX_CONNECTIONS = int(os.getenv("KAZI_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("KAZI_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("KAZI_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("KAZI_HTTP_TIMEOUT", "30"))
+HTTP2_ENABLED = os.getenv("KAZI_HTTP2", "").lower() in ("1", "true", "yes")
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log.warning("KAZI_HTTP2 set but 'h2' is not installed — using HTTP/1.1")
+        return False
+    return True
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=_http2_available(),
+    )
+
+
+def client_for(url: str) -> httpx.AsyncClient:
+    """Return the shared client for `url`'s scheme+host, creating it on first use."""
+    origin = _origin(url)
+    client = _clients.get(origin)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[origin] = client
+    return client
+
+
+async def close_clients():
+    """Close every pooled client. Called once on app shutdown."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            log.error("error closing client: %s", e)
+
@@ -0,0 +1,179 @@
+"""
+Kazi fast-path intents — answer common standalone commands without Claude.
+
+`parse(text, now_local)` recognises a few message shapes with small regex
+grammars and returns an intent dict, or None when it is not sure (then the
+message goes to the LLM exactly as before):
+
+    {"intent": "time"}                          what time is it / time?
+    {"intent": "invite"}                        invite / share kazi
+    {"intent": "reminder", "task", "at"}        remind me (to X) at 5pm / at 17:30 / in 20 minutes
+                                                / tomorrow at 9am (to X)
+
+Reminder times are resolved against `now_local`, the user's local time, so
+"at 5pm" means 5pm in their timezone and relative times are added in UTC
+(DST-safe). Anything ambiguous — a bare "at 5", "this evening", weekdays,
+dates, "every day" — is left to the LLM. Upgrade and timezone changes are
+already answered directly in get_response and are counted here via `record`.
+"""
+
+import re
+from datetime import timedelta, timezone
+
+from kazi_metrics import INTENTS_TOTAL
+
+INVITE_MSG = (
+    "Share Kazi with a friend — just forward this:\n\n"
+    "Hey! Try Kazi - an AI assistant on WhatsApp: https://wa.me/15734125273?text=Hi%20Kazi"
+)
+
+STATS = {"messages": 0, "fast_path": 0}
+
+# ---------- Grammar ----------
+_POLITE = r"(?:(?:hey|hi|ok|okay|kazi|please|pls|can you|could you|would you)[\s,]+)*"
+
+_TIME_QUERY = re.compile(
+    _POLITE + r"(?:what(?:'s|s| is) the time(?: now)?|what time is it(?: now)?|(?:the )?time(?: now)?|"
+    r"current time|tell me the time|what(?:'s|s| is) the current time)(?: please| pls)?"
+)
+_INVITE = re.compile(
+    _POLITE + r"(?:invite(?: a friend| friends| someone)?|share(?: kazi)?|"
+    r"how (?:do|can) i (?:invite (?:a friend|friends|someone)|share(?: kazi)?)|tell a friend)(?: please| pls)?"
+)
+_REMIND = re.compile(_POLITE + r"remind me\b\s*(?P<rest>.*)")
+
+_CLOCK = r"(?P<h>\d{1,2})(?:[:.](?P<m>\d{2}))?\s*(?P<ampm>[ap]\.?\s?m\.?)?"
+_AT = re.compile(r"\b(?:at|@)\s+(?:" + _CLOCK + r"|(?P<word>noon|midday|midnight))(?=\s|$|[,.!])")
+_DAY = re.compile(r"\b(?P<day>today|tomorrow)\b")
+_IN = re.compile(
+    r"\bin\s+(?P<n>\d+|an?|one|two|three|four|five|ten|fifteen|twenty|thirty|forty five|half an?)\s*"
+    r"(?P<unit>minutes?|mins?|hours?|hrs?|h)\b"
+)
+_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "ten": 10,
+    "fifteen": 15, "twenty": 20, "thirty": 30, "forty five": 45,
+}
+# Phrases that change the meaning of a time in ways the grammar doesn't model.
+_UNSURE = re.compile(
+    r"\b(?:every|daily|weekly|each|morning|afternoon|evening|tonight|noonish|next|on|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tue|wed|thu|fri|sat|sun|"
+    r"week|month|year|days?|before|after|until|around|about \d|ish)\b|\d+/\d+"
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("’", "'").split()).strip(" ?!.")
+
+
+def _clock(m) -> tuple | None:
+    """(hour, minute) from an _AT match, or None if the hour is ambiguous or invalid."""
+    if m.group("word"):
+        return (0, 0) if m.group("word") == "midnight" else (12, 0)
+    hour, minute = int(m.group("h")), int(m.group("m") or 0)
+    ampm = (m.group("ampm") or "").replace(".", "").replace(" ", "")
+    if minute > 59:
+        return None
+    if ampm:
+        if not 1 <= hour <= 12:
+            return None
+        return (hour % 12 + (12 if ampm == "pm" else 0), minute)
+    # Without am/pm only unambiguous 24-hour times: 13-23, or a leading zero ("07:30").
+    if hour > 23 or (1 <= hour <= 12 and not m.group("h").startswith("0")):
+        return None
+    return (hour, minute)
+
+
+def _task(rest: str) -> str | None:
+    task = " ".join(rest.split()).strip(" ,.!")
+    task = re.sub(r"^(?:to|that|about|i need to|i have to)\s+", "", task)
+    task = re.sub(r"\s+(?:to|for)$", "", task).strip(" ,.!")
+    return task or None
+
+
+def _parse_reminder(rest: str, now_local):
+    if _UNSURE.search(rest):
+        return None
+    relative = _IN.search(rest)
+    absolute = _AT.search(rest)
+    day = _DAY.search(rest)
+    if bool(relative) == bool(absolute):
+        return None  # neither, or both: let the LLM sort it out
+    if relative:
+        if day:
+            return None
+        n, unit = relative.group("n"), relative.group("unit")
+        if n.startswith("half"):
+            if not unit.startswith("h"):
+                return None
+            delta = timedelta(minutes=30)
+        else:
+            amount = int(n) if n.isdigit() else _NUMBERS[n]
+            delta = timedelta(hours=amount) if unit.startswith("h") else timedelta(minutes=amount)
+        if not timedelta(minutes=1) <= delta <= timedelta(hours=24):
+            return None
+        at = (now_local.astimezone(timezone.utc) + delta).astimezone(now_local.tzinfo)
+        spans = [relative.span()]
+    else:
+        clock = _clock(absolute)
+        if clock is None:
+            return None
+        at = now_local.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+        if day and day.group("day") == "tomorrow":
+            at += timedelta(days=1)
+        elif at <= now_local:
+            if day:
+                return None  # "today at 9am" after 9am
+            at += timedelta(days=1)
+        spans = [absolute.span()] + ([day.span()] if day else [])
+    for start, end in sorted(spans, reverse=True):
+        rest = rest[:start] + " " + rest[end:]
+    task = _task(rest)
+    if task is None or re.search(r"\d", task):
+        return None
+    return {"intent": "reminder", "task": task, "at": at, "relative": bool(relative)}
+
+
+def parse(text: str, now_local) -> dict | None:
+    """Return the fast-path intent for `text`, or None to fall back to the LLM."""
+    msg = _normalize(text)
+    if not msg or len(msg) > 200 or "\n" in text.strip():
+        return None
+    if _TIME_QUERY.fullmatch(msg):
+        return {"intent": "time"}
+    if _INVITE.fullmatch(msg):
+        return {"intent": "invite"}
+    m = _REMIND.fullmatch(msg)
+    if m:
+        return _parse_reminder(m.group("rest"), now_local)
+    return None
+
+
+def reply(intent: dict, now_local, tz_name: str) -> str:
+    if intent["intent"] == "time":
+        return f"🕐 It's {now_local.strftime('%H:%M')} ({tz_name})."
+    if intent["intent"] == "invite":
+        return INVITE_MSG
+    at = intent["at"]
+    when = at.strftime("%H:%M")
+    if at.date() != now_local.date():
+        when += " tomorrow"
+    if intent["relative"]:
+        minutes = round((at.astimezone(timezone.utc) - now_local.astimezone(timezone.utc)).total_seconds() / 60)
+        span = f"{minutes} min" if minutes < 60 else f"{minutes / 60:g} h"
+        when = f"in {span} ({when})"
+    else:
+        when = f"at {when}"
+    return f"✅ Reminder set: {intent['task']} {when}."
+
+
+def record(intent: str):
+    """Count one standalone message as answered by `intent` ('llm' when none matched)."""
+    STATS["messages"] += 1
+    if intent != "llm":
+        STATS["fast_path"] += 1
+    INTENTS_TOTAL.inc(intent)
+
+
+def stats() -> dict:
+    return {**STATS, "hit_rate": round(STATS["fast_path"] / STATS["messages"], 4) if STATS["messages"] else 0.0}
+
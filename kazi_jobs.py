@@ -0,0 +1,235 @@
+"""
+Kazi in-process job queue.
+
+`JobQueue` runs `await fn(*args)` jobs on a fixed pool of workers. It backs
+the webhook (which answers Twilio right away and replies from a worker) and
+gateway routing (one queue per product). It is bounded: `submit` returns
+False instead of blocking when it is full, so the caller can answer "busy".
+
+`Mailboxes` keeps per-sender order in front of a JobQueue: jobs posted under
+one key (a phone number) run one at a time in arrival order, different keys
+in parallel, and a mailbox exists only while its key has work.
+
+`Coalescer` optionally merges one sender's messages that arrive within
+`window_ms` of each other into a single `flush` call. Once `flush_all` has
+run (shutdown) it reports itself disabled, so callers handle messages
+directly instead of opening bursts that would flush after the queues are gone.
+
+Each job runs in a copy of the context it was submitted from, so the kazi_log
+request id follows a message onto the workers.
+"""
+
+import time
+import asyncio
+import contextvars
+from collections import deque
+
+import kazi_log
+
+log = kazi_log.get_logger("jobs")
+
+
+def _run_in(ctx: contextvars.Context, fn, args):
+    """Run `fn(*args)` as a task inside `ctx`; returns the task to await."""
+    return ctx.run(asyncio.create_task, fn(*args))
+
+
+class JobQueue:
+    def __init__(self, name: str, workers: int, maxsize: int):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue = None
+        self._tasks = []
+        self._busy = 0
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_depth": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    def start(self):
+        """Spawn the workers. Must be called from inside the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(self._queue), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    def submit(self, fn, *args) -> bool:
+        """Enqueue `await fn(*args)`. Returns False if the queue is full or not started."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait((time.perf_counter(), contextvars.copy_context(), fn, args))
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            return False
+        self._stats["submitted"] += 1
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            enqueued_at, ctx, fn, args = await queue.get()
+            wait_ms = (time.perf_counter() - enqueued_at) * 1000
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+            self._busy += 1
+            try:
+                await _run_in(ctx, fn, args)
+                self._stats["completed"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                log.error("job error in %s: %s", self.name, e, exc_info=True)
+            finally:
+                self._busy -= 1
+                queue.task_done()
+
+    async def drain(self, timeout: float = 20.0):
+        """Stop accepting work, wait up to `timeout` for queued jobs, then stop the workers."""
+        queue, self._queue = self._queue, None
+        if queue is not None:
+            try:
+                await asyncio.wait_for(queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                log.warning("%s drain timed out with %d jobs queued", self.name, queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        done = self._stats["completed"] + self._stats["failed"] or 1
+        return {
+            **self._stats,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "busy_workers": self._busy,
+            "workers": self.workers,
+            "avg_wait_ms": round(self._stats["wait_ms_total"] / done, 2),
+        }
+
+
+class Mailboxes:
+    def __init__(self, queue: JobQueue, max_pending: int = 20, batch: int = 8):
+        self.queue = queue
+        self.max_pending = max_pending  # per-key backlog beyond the running job
+        self.batch = batch  # jobs a key may run back-to-back before yielding its worker
+        self._boxes: dict = {}
+        self._stats = {"posted": 0, "rejected": 0, "max_active": 0}
+
+    def post(self, key, fn, *args) -> bool:
+        """Run `await fn(*args)` after every earlier job for `key`. False if it can't be queued."""
+        box = self._boxes.get(key)
+        if box is not None:
+            if len(box) >= self.max_pending:
+                self._stats["rejected"] += 1
+                return False
+            box.append((contextvars.copy_context(), fn, args))
+            self._stats["posted"] += 1
+            return True
+        self._boxes[key] = deque()
+        if not self.queue.submit(self._run, key, contextvars.copy_context(), fn, args):
+            del self._boxes[key]
+            self._stats["rejected"] += 1
+            return False
+        self._stats["posted"] += 1
+        self._stats["max_active"] = max(self._stats["max_active"], len(self._boxes))
+        return True
+
+    async def _run(self, key, ctx, fn, args):
+        ran = 0
+        while True:
+            try:
+                await _run_in(ctx, fn, args)
+            except Exception as e:
+                log.error("%s mailbox job error for %s: %s", self.queue.name, key, e, exc_info=True)
+            ran += 1
+            box = self._boxes[key]
+            if not box:
+                del self._boxes[key]  # idle: evict
+                return
+            ctx, fn, args = box.popleft()
+            # Hand the rest of this key's backlog back to the queue so one chatty
+            # sender can't pin a worker; if the queue is full, just keep going here.
+            if ran >= self.batch and self.queue.submit(self._run, key, ctx, fn, args):
+                return
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "active": len(self._boxes),
+            "pending": sum(len(b) for b in self._boxes.values()),
+        }
+
+
+
+class Coalescer:
+    def __init__(self, name: str, window_ms: int, flush, max_window_ms: int = None):
+        self.name = name
+        self.window = window_ms / 1000
+        self.max_window = (max_window_ms if max_window_ms is not None else window_ms * 4) / 1000
+        self.flush = flush  # async flush(key, texts, context)
+        self._pending: dict = {}  # key -> [texts, context, first_at, deadline]
+        self._timers: set = set()
+        self._closed = False
+        self._stats = {"messages": 0, "flushes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and not self._closed
+
+    def add(self, key, text: str, context=None) -> bool:
+        """Buffer `text` for `key`. Returns True if it opened a new burst."""
+        self._stats["messages"] += 1
+        now = time.monotonic()
+        entry = self._pending.get(key)
+        if entry is not None:
+            entry[0].append(text)
+            entry[1] = context
+            entry[3] = min(now + self.window, entry[2] + self.max_window)
+            return False
+        self._pending[key] = [[text], context, now, now + self.window]
+        timer = asyncio.create_task(self._wait_and_flush(key))
+        self._timers.add(timer)
+        timer.add_done_callback(self._timers.discard)
+        return True
+
+    async def _wait_and_flush(self, key):
+        while True:
+            delay = self._pending[key][3] - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self._flush(key)
+
+    async def _flush(self, key):
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        self._stats["flushes"] += 1
+        try:
+            await self.flush(key, entry[0], entry[1])
+        except Exception as e:
+            log.error("%s coalesced flush error for %s: %s", self.name, key, e, exc_info=True)
+
+    async def flush_all(self):
+        """Flush every open burst now and stop accepting new ones (used on shutdown)."""
+        self._closed = True
+        for timer in list(self._timers):
+            timer.cancel()
+        for key in list(self._pending):
+            await self._flush(key)
+
+    def stats(self) -> dict:
+        buffered = sum(len(entry[0]) for entry in self._pending.values())
+        return {
+            **self._stats,
+            "window_ms": int(self.window * 1000),
+            "open_bursts": len(self._pending),
+            "calls_saved": self._stats["messages"] - buffered - self._stats["flushes"],
+        }
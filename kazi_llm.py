@@ -0,0 +1,143 @@
+"""
+Kazi LLM client — async Anthropic calls behind a bounded concurrency pool.
+
+`create_message` awaits the async client with at most LLM_MAX_IN_FLIGHT calls
+in flight and records how long callers queued for a slot. The anthropic SDK
+is imported and the client built on first use (or by `warm_up` after startup),
+not at import time.
+
+Prompt caching: `cached_system(static, dynamic)` marks the static
+instructions as a cache breakpoint (unless LLM_PROMPT_CACHING is off) and
+appends the per-request text after it. Prompt caching is generally available,
+so no beta header is needed.
+Token usage, including cache reads and writes, is counted from
+`response.usage`. Anthropic only caches prefixes above a model-specific
+minimum (1024 tokens for Sonnet); shorter prompts show zero cache reads.
+"""
+
+import os
+import time
+import asyncio
+
+from kazi_metrics import LLM_TOKENS_TOTAL, stage
+
+# ---------- Env ----------
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "claude-sonnet-4-20250514")
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_PROMPT_CACHING = os.getenv("LLM_PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+
+_claude = None
+_slots = asyncio.Semaphore(LLM_MAX_IN_FLIGHT)
+
+# Simple in-process counters, surfaced on /health.
+STATS = {
+    "calls": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "in_flight": 0,
+    "waiting": 0,
+    "queue_wait_ms_total": 0.0,
+    "queue_wait_ms_max": 0.0,
+    "call_ms_total": 0.0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+}
+
+_USAGE_FIELDS = {
+    "input_tokens": "input",
+    "output_tokens": "output",
+    "cache_read_input_tokens": "cache_read",
+    "cache_creation_input_tokens": "cache_write",
+}
+
+
+def get_client():
+    global _claude
+    if _claude is None:
+        import anthropic
+        _claude = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, timeout=LLM_TIMEOUT_SECONDS)
+    return _claude
+
+
+async def warm_up():
+    """Import the SDK and build the client off the event loop."""
+    await asyncio.to_thread(get_client)
+
+
+def cached_system(static: str, dynamic: str = None) -> list:
+    """System blocks with `static` as a cache breakpoint and `dynamic` after it."""
+    blocks = [{"type": "text", "text": static}]
+    if LLM_PROMPT_CACHING:
+        blocks[0]["cache_control"] = {"type": "ephemeral"}
+    if dynamic:
+        blocks.append({"type": "text", "text": dynamic})
+    return blocks
+
+
+def _record_usage(usage):
+    if usage is None:
+        return
+    for field, kind in _USAGE_FIELDS.items():
+        n = getattr(usage, field, None) or 0
+        if n:
+            STATS[field] += n
+            LLM_TOKENS_TOTAL.inc(kind, amount=n)
+
+
+async def create_message(system, messages, max_tokens: int = 500, **kwargs):
+    """
+    Await a Claude completion once a slot is free.
+    Raises asyncio.TimeoutError if the call exceeds LLM_TIMEOUT_SECONDS.
+    """
+    queued_at = time.perf_counter()
+    STATS["waiting"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        STATS["waiting"] -= 1
+    started = time.perf_counter()
+    wait_ms = (started - queued_at) * 1000
+    STATS["queue_wait_ms_total"] += wait_ms
+    STATS["queue_wait_ms_max"] = max(STATS["queue_wait_ms_max"], wait_ms)
+    STATS["in_flight"] += 1
+    try:
+        with stage("claude"):
+            response = await asyncio.wait_for(
+                get_client().messages.create(
+                    model=LLM_MODEL,
+                    max_tokens=max_tokens,
+                    system=system,
+                    messages=messages,
+                    **kwargs,
+                ),
+                timeout=LLM_TIMEOUT_SECONDS,
+            )
+        _record_usage(getattr(response, "usage", None))
+        return response
+    except asyncio.TimeoutError:
+        STATS["timeouts"] += 1
+        raise
+    except Exception:
+        STATS["errors"] += 1
+        raise
+    finally:
+        STATS["in_flight"] -= 1
+        STATS["calls"] += 1
+        STATS["call_ms_total"] += (time.perf_counter() - started) * 1000
+        _slots.release()
+
+
+def stats() -> dict:
+    calls = STATS["calls"] or 1
+    cacheable = STATS["cache_read_input_tokens"] + STATS["cache_creation_input_tokens"] + STATS["input_tokens"]
+    return {
+        **STATS,
+        "cache_hit_ratio": round(STATS["cache_read_input_tokens"] / cacheable, 4) if cacheable else 0.0,
+        "max_in_flight": LLM_MAX_IN_FLIGHT,
+        "avg_queue_wait_ms": round(STATS["queue_wait_ms_total"] / calls, 2),
+        "avg_call_ms": round(STATS["call_ms_total"] / calls, 2),
+    }
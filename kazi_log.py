@@ -0,0 +1,131 @@
+"""
+Kazi logging — structured JSON lines written off the event loop.
+
+Loggers from `get_logger` hand records to a bounded in-memory queue; a
+QueueListener thread formats them as one JSON object per line and writes
+them to stdout. When the queue is full a record is dropped and counted
+rather than blocking the loop.
+
+Every record carries the current `REQUEST_ID` (set per inbound message and
+carried through the job queues) and the kazi_metrics `PATH`. High-volume
+lines can be sampled: `log.info(..., extra=sample(0.05))` keeps roughly 5%
+of them (scaled by LOG_SAMPLE_RATE). Warnings and errors are never sampled.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import atexit
+import logging
+import traceback
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from kazi_metrics import PATH
+
+# ---------- Env ----------
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # multiplier on per-line sample rates
+
+REQUEST_ID = ContextVar("kazi_request_id", default=None)
+
+STATS = {"dropped": 0, "sampled_out": 0}
+
+
+def new_request_id(rid: str = None) -> str:
+    """Start a correlation id (e.g. a Twilio MessageSid) for the current context and return it."""
+    rid = rid or uuid.uuid4().hex[:12]
+    REQUEST_ID.set(rid)
+    return rid
+
+
+def sample(rate: float) -> dict:
+    """`extra=` for a high-volume line that should be kept with probability `rate`."""
+    return {"sample_rate": rate}
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        if record.path != "system":
+            entry["path"] = record.path
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    """Runs on the calling thread: stamps context vars and applies sampling."""
+
+    def filter(self, record) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None and record.levelno < logging.WARNING:
+            if random.random() >= rate * LOG_SAMPLE_RATE:
+                STATS["sampled_out"] += 1
+                return False
+        record.request_id = REQUEST_ID.get()
+        record.path = PATH.get()
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Same process, so the record can cross as-is; formatting happens on the listener thread.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            STATS["dropped"] += 1
+
+
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_stream = logging.StreamHandler(sys.stdout)
+_stream.setFormatter(_JsonFormatter())
+_listener = QueueListener(_queue, _stream, respect_handler_level=False)
+
+_handler = _DroppingQueueHandler(_queue)
+_handler.addFilter(_ContextFilter())
+
+_root = logging.getLogger("kazi")
+_root.setLevel(LOG_LEVEL)
+_root.addHandler(_handler)
+_root.propagate = False
+
+_listener.start()
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under the `kazi` tree, e.g. get_logger("gateway")."""
+    return logging.getLogger(f"kazi.{name}")
+
+
+def stats() -> dict:
+    return {**STATS, "queued": _queue.qsize(), "level": LOG_LEVEL}
@@ -0,0 +1,154 @@
+"""
+Kazi metrics — minimal Prometheus text-format counters, histograms and gauges.
+
+Recording is a dict lookup plus an add (histograms add a bisect), so it costs
+on the order of a microsecond per event; rendering happens only when /metrics
+is scraped. Everything lives in one process-local registry.
+
+`PATH` is a context variable naming which flow the current work belongs to
+(gateway, aifredo, standalone, reminder, scheduled); stage timings are
+labelled with it so the same stage (e.g. send_whatsapp) splits by caller.
+"""
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+PATH = ContextVar("kazi_path", default="system")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, v in self._values.items():
+            yield f"{self.name}{_fmt_labels(self.labels, values)} {v}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _fmt_labels(self.labels + ("le",), values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _fmt_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {series[-1]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+def register_collector(fn):
+    """`fn()` returns [(name, type, help, {label tuple or (): value}, label names)] at scrape time."""
+    _collectors.append(fn)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        try:
+            families = fn()
+        except Exception as e:
+            lines.append(f"# collector error: {e}")
+            continue
+        for name, mtype, help, values, label_names in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {mtype}")
+            for label_values, v in values.items():
+                lines.append(f"{name}{_fmt_labels(label_names, label_values)} {v}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Kazi metrics ----------
+STAGE_SECONDS = Histogram(
+    "kazi_stage_seconds", "Latency of each message-handling stage.", ("stage", "path")
+)
+PRODUCT_CALL_SECONDS = Histogram(
+    "kazi_product_call_seconds", "Latency of call_product_message by product.", ("product", "outcome")
+)
+MESSAGES_TOTAL = Counter("kazi_messages_total", "Inbound messages handled, by path.", ("path",))
+WEBHOOK_DUPLICATES_TOTAL = Counter(
+    "kazi_webhook_duplicates_total", "Twilio webhook retries absorbed by MessageSid dedup, by where they were caught.", ("source",)
+)
+LLM_TOKENS_TOTAL = Counter(
+    "kazi_llm_tokens_total", "Claude tokens by kind (input, output, cache_read, cache_write).", ("kind",)
+)
+INTENTS_TOTAL = Counter(
+    "kazi_intents_total", "Standalone messages by intent; 'llm' means no fast path matched.", ("intent",)
+)
+WHATSAPP_SEND_TOTAL = Counter(
+    "kazi_whatsapp_send_total", "Outbound Twilio sends by outcome (sent, retried, failed).", ("outcome",)
+)
+REMINDER_LAG_SECONDS = Histogram(
+    "kazi_reminder_lag_seconds", "Reminder send time minus remind_at.", (), LAG_BUCKETS
+)
+SCHEDULED_LAG_SECONDS = Histogram(
+    "kazi_scheduled_lag_seconds", "Scheduled push send time minus next_run_at.", (), LAG_BUCKETS
+)
+OUTBOX_LAG_SECONDS = Histogram(
+    "kazi_outbox_lag_seconds", "Delivery time minus due time for outbox messages, by source.", ("source",), LAG_BUCKETS
+)
+
+
+def stage(name: str):
+    """Time a block as `name` under the current PATH: `with stage("claude"): ...`"""
+    return _Timer(STAGE_SECONDS, (name, PATH.get()))
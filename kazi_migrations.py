@@ -0,0 +1,98 @@
+"""
+Kazi schema migrations.
+
+Ordered SQL files in migrations/ (NNNN_name.sql) are applied once each and
+recorded in kazi_schema_migrations. On boot `migrate` does a single
+lock-free version check; only when something is pending does it take a
+Postgres advisory lock, so concurrent replicas apply each file exactly once
+and a current schema costs one round trip.
+
+A file whose first line is `-- kazi:no-transaction` runs statement by
+statement outside a transaction (needed for CREATE INDEX CONCURRENTLY);
+every other file runs inside one transaction together with its version row.
+"""
+
+import re
+import asyncpg
+from pathlib import Path
+
+import kazi_log
+
+log = kazi_log.get_logger("db")
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+ADVISORY_LOCK_KEY = 0x6B617A69  # "kazi"
+NO_TRANSACTION_MARKER = "-- kazi:no-transaction"
+
+_FILE_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+
+def load_migrations():
+    """Return [(version, name, sql)] sorted by version."""
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        m = _FILE_RE.match(path.name)
+        if m:
+            migrations.append((int(m.group(1)), m.group(2), path.read_text()))
+    migrations.sort()
+    versions = [v for v, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+
+def _statements(sql: str):
+    """Split a no-transaction file into statements (no semicolons inside statements)."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+async def _current_version(conn) -> int:
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM kazi_schema_migrations")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def migrate(db_pool):
+    """Apply pending migrations. A no-op (one query) when the schema is current."""
+    if not db_pool:
+        return
+    migrations = load_migrations()
+    if not migrations:
+        return
+    latest = migrations[-1][0]
+    async with db_pool.acquire() as conn:
+        if await _current_version(conn) >= latest:
+            return
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS kazi_schema_migrations (
+                    version    INT PRIMARY KEY,
+                    name       TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT NOW()
+                )
+                """
+            )
+            # Re-read under the lock: another replica may have just applied them.
+            applied = {r["version"] for r in await conn.fetch("SELECT version FROM kazi_schema_migrations")}
+            for version, name, sql in migrations:
+                if version in applied:
+                    continue
+                log.info("applying migration %04d_%s", version, name)
+                if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                    for stmt in _statements(sql):
+                        await conn.execute(stmt)
+                    await conn.execute(
+                        "INSERT INTO kazi_schema_migrations (version, name) VALUES ($1, $2)", version, name
+                    )
+                else:
+                    async with conn.transaction():
+                        await conn.execute(sql)
+                        await conn.execute(
+                            "INSERT INTO kazi_schema_migrations (version, name) VALUES ($1, $2)", version, name
+                        )
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
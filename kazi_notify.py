@@ -0,0 +1,87 @@
+"""
+Kazi LISTEN/NOTIFY — one dedicated Postgres connection for every channel.
+
+A LISTEN holds its connection for the life of the process, so it uses a plain
+`asyncpg.connect()` outside the pool instead of pinning pooled connections
+that request handlers and workers need. Modules `subscribe` their channel at
+import time; `listen_loop` connects, attaches every handler and reconnects
+after NOTIFY_RECONNECT_SECONDS whenever the connection drops.
+
+`on_connect` hooks run after every (re)connect, so a subscriber can reload
+whatever it may have missed; `on_lost` hooks run as soon as it drops.
+"""
+
+import os
+import asyncio
+
+import asyncpg
+
+import kazi_log
+
+log = kazi_log.get_logger("notify")
+
+# ---------- Env ----------
+NOTIFY_RECONNECT_SECONDS = float(os.getenv("NOTIFY_RECONNECT_SECONDS", "5"))
+NOTIFY_PING_SECONDS = float(os.getenv("NOTIFY_PING_SECONDS", "60"))
+
+# channel -> (callback, on_connect, on_lost)
+_subscriptions: dict = {}
+_stats = {"connected": False, "connects": 0, "notifications": 0}
+
+
+def subscribe(channel: str, callback, on_connect=None, on_lost=None):
+    """Register `callback(conn, pid, channel, payload)` for `channel`. Hooks take no arguments."""
+    def counted(*args):
+        _stats["notifications"] += 1
+        callback(*args)
+
+    _subscriptions[channel] = (counted, on_connect, on_lost)
+
+
+def _run_hooks(index: int):
+    for channel, subscription in _subscriptions.items():
+        hook = subscription[index]
+        if hook is None:
+            continue
+        try:
+            hook()
+        except Exception as e:
+            log.error("%s hook error: %s", channel, e, exc_info=True)
+
+
+async def listen_loop(database_url: str):
+    """Background task: hold the LISTEN connection, reconnecting until cancelled."""
+    if not database_url:
+        return
+    while True:
+        conn = None
+        lost = asyncio.Event()
+        try:
+            conn = await asyncpg.connect(database_url)
+            conn.add_termination_listener(lambda c: lost.set())
+            for channel, (callback, _, _) in _subscriptions.items():
+                await conn.add_listener(channel, callback)
+            _stats["connected"] = True
+            _stats["connects"] += 1
+            _run_hooks(1)
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), timeout=NOTIFY_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    # An idle socket can die without a termination event; a ping finds out.
+                    await conn.fetchval("SELECT 1", timeout=10)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("LISTEN connection error: %s", e)
+        finally:
+            if _stats["connected"]:
+                _stats["connected"] = False
+                _run_hooks(2)
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+        await asyncio.sleep(NOTIFY_RECONNECT_SECONDS)
+
+
+def stats() -> dict:
+    return {**_stats, "channels": sorted(_subscriptions)}
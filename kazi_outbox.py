@@ -0,0 +1,287 @@
+"""
+Kazi outbox — every outgoing WhatsApp message is a row before it is a POST.
+
+Callers write to kazi_outbox, in the same transaction as the state change
+that produced the message when there is one (a reminder flipping to sent,
+a scheduled push recording last_sent). OUTBOX_WORKERS delivery loops claim
+due rows in batches with `FOR UPDATE SKIP LOCKED` and hand them to the
+rate-limited kazi_twilio sender, so a slow or failing Twilio call never holds
+a request handler or the reminder loop.
+
+Each claim makes at most one Twilio POST per row (the sender's own retries
+are off here), so the outbox is the only retry layer: failed sends go back
+to pending with exponential backoff (next_attempt_at); a row becomes `dead`
+after OUTBOX_MAX_ATTEMPTS or when Twilio rejects the message itself (invalid
+or opted-out number, see DeliveryFailed.permanent).
+
+A claim is a lease: rows claimed by a process that died are picked up again
+after OUTBOX_CLAIM_LEASE_SECONDS. A batch starts no POST after half its
+lease (rows still waiting on the rate limit go back to pending), so a live
+worker records its batch before the lease runs out. Delivery is
+at-least-once — a crash between Twilio accepting a message and the row being
+marked sent resends it.
+
+Messages to one number go out in id order: a row is only claimed once every
+older pending row for its number has been sent or given up on, whichever
+worker or replica holds it and even while it waits out a retry backoff. So
+each batch carries at most one message per number, and a gateway ack always
+lands before its reply.
+"""
+
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import kazi_log
+import kazi_stats
+import kazi_twilio
+from kazi_metrics import PATH, REMINDER_LAG_SECONDS, SCHEDULED_LAG_SECONDS, OUTBOX_LAG_SECONDS, stage
+
+log = kazi_log.get_logger("outbox")
+
+# ---------- Env ----------
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_CLAIM_LEASE_SECONDS = int(os.getenv("OUTBOX_CLAIM_LEASE_SECONDS", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "900"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+_LAG = {"reminder": REMINDER_LAG_SECONDS, "scheduled": SCHEDULED_LAG_SECONDS}
+
+_wake = asyncio.Event()
+_tasks: list = []
+_stopping = False
+_stats = {"enqueued": 0, "sent": 0, "retried": 0, "dead": 0, "batches": 0}
+
+
+# ---------- Enqueue ----------
+async def enqueue(conn, to_number: str, body: str, source: str = "system", due_at: datetime = None) -> int:
+    """
+    Insert one message on `conn` (join the caller's transaction), tagged with
+    the current kazi_log request id. Call `wake()` after commit.
+    """
+    _stats["enqueued"] += 1
+    return await conn.fetchval(
+        """
+        INSERT INTO kazi_outbox (to_number, body, source, due_at, request_id)
+        VALUES ($1, $2, $3, COALESCE($4, NOW()), $5)
+        RETURNING id
+        """,
+        to_number, body, source, due_at, kazi_log.REQUEST_ID.get(),
+    )
+
+
+async def enqueue_many(conn, to_numbers, bodies, source: str, due_ats=None, request_ids=None):
+    """Insert a batch of messages in one statement on `conn`."""
+    if not to_numbers:
+        return
+    n = len(to_numbers)
+    _stats["enqueued"] += n
+    await conn.execute(
+        """
+        INSERT INTO kazi_outbox (to_number, body, source, due_at, request_id)
+        SELECT t, b, $3, COALESCE(d, NOW()), r
+        FROM unnest($1::text[], $2::text[], $4::timestamptz[], $5::text[]) AS m(t, b, d, r)
+        """,
+        list(to_numbers), list(bodies), source, list(due_ats or [None] * n), list(request_ids or [None] * n),
+    )
+
+
+async def send(db_pool, to_number: str, body: str, source: str = "system") -> int:
+    """Queue a standalone message in its own statement and wake the local workers."""
+    async with db_pool.acquire() as conn:
+        outbox_id = await enqueue(conn, to_number, body, source)
+    wake()
+    return outbox_id
+
+
+def wake():
+    """Nudge the delivery loops in this process (others pick rows up on their next poll)."""
+    _wake.set()
+
+
+# ---------- Delivery ----------
+async def claim_batch(db_pool, limit: int = OUTBOX_BATCH_SIZE):
+    """Claim due rows that are the oldest pending message for their number."""
+    async with db_pool.acquire() as conn:
+        return await conn.fetch(
+            """
+            UPDATE kazi_outbox SET claimed_at = NOW(), attempts = attempts + 1
+            WHERE id IN (
+                SELECT o.id FROM kazi_outbox o
+                WHERE o.status = 'pending'
+                  AND o.next_attempt_at <= NOW()
+                  AND (o.claimed_at IS NULL OR o.claimed_at < NOW() - make_interval(secs => $2))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM kazi_outbox older
+                      WHERE older.to_number = o.to_number AND older.status = 'pending' AND older.id < o.id
+                  )
+                ORDER BY o.next_attempt_at, o.id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, to_number, body, source, due_at, attempts, request_id
+            """,
+            limit,
+            OUTBOX_CLAIM_LEASE_SECONDS,
+        )
+
+
+async def _deliver(sender, row, deadline: float, results: dict):
+    """Send one claimed row with a single Twilio attempt; results[id] = (sid, error)."""
+    PATH.set(row["source"])
+    # Log the send under the id of the message that produced it (reminders start a fresh one).
+    kazi_log.new_request_id(row["request_id"])
+    try:
+        with stage("twilio"):
+            sid = await sender.send(row["to_number"], row["body"], max_attempts=1, deadline=deadline)
+            results[row["id"]] = (sid, None)
+    except kazi_twilio.DeliveryFailed as e:
+        results[row["id"]] = (None, e)
+    except Exception as e:
+        results[row["id"]] = (None, kazi_twilio.DeliveryFailed("error", str(e)))
+
+
+async def _record(db_pool, rows, results: dict):
+    sent_ids, sids, retry_ids, retry_errors, dead_ids, dead_errors = [], [], [], [], [], []
+    reminders_sent = 0
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        sid, error = results.get(row["id"], (None, kazi_twilio.DeliveryFailed("error", "not attempted")))
+        if error is None:
+            sent_ids.append(row["id"])
+            sids.append(sid)
+            reminders_sent += row["source"] == "reminder"
+            OUTBOX_LAG_SECONDS.observe((now - row["due_at"]).total_seconds(), row["source"])
+            lag = _LAG.get(row["source"])
+            if lag is not None:
+                lag.observe((now - row["due_at"]).total_seconds())
+        elif error.permanent or row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            dead_ids.append(row["id"])
+            dead_errors.append(str(error))
+            log.error("outbox message %s to %s is dead: %s", row["id"], row["to_number"], error)
+        else:
+            retry_ids.append(row["id"])
+            retry_errors.append(str(error))
+    async with db_pool.acquire() as conn:
+        if sent_ids:
+            await conn.execute(
+                """
+                UPDATE kazi_outbox o SET status = 'sent', sent_at = NOW(), twilio_sid = s.sid, claimed_at = NULL
+                FROM unnest($1::bigint[], $2::text[]) AS s(id, sid)
+                WHERE o.id = s.id
+                """,
+                sent_ids, sids,
+            )
+        if retry_ids:
+            await conn.execute(
+                """
+                UPDATE kazi_outbox o
+                SET claimed_at = NULL, last_error = f.error,
+                    next_attempt_at = NOW() + make_interval(secs => LEAST($3, $4 * power(2, o.attempts - 1)))
+                FROM unnest($1::bigint[], $2::text[]) AS f(id, error)
+                WHERE o.id = f.id
+                """,
+                retry_ids, retry_errors, OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_BACKOFF_SECONDS,
+            )
+        if dead_ids:
+            await conn.execute(
+                """
+                UPDATE kazi_outbox o SET status = 'dead', claimed_at = NULL, last_error = f.error
+                FROM unnest($1::bigint[], $2::text[]) AS f(id, error)
+                WHERE o.id = f.id
+                """,
+                dead_ids, dead_errors,
+            )
+    if reminders_sent:
+        kazi_stats.bump("reminders_sent", reminders_sent)
+    _stats["sent"] += len(sent_ids)
+    _stats["retried"] += len(retry_ids)
+    _stats["dead"] += len(dead_ids)
+
+
+async def deliver_batch(db_pool, sender) -> int:
+    """Claim and deliver one batch. Returns how many rows were claimed."""
+    rows = await claim_batch(db_pool)
+    if not rows:
+        return 0
+    _stats["batches"] += 1
+    # No POST starts after half the lease; one in flight then ends within the
+    # HTTP timeout, so the batch is recorded before another worker can reclaim it.
+    deadline = time.monotonic() + OUTBOX_CLAIM_LEASE_SECONDS / 2
+    results: dict = {}
+    await asyncio.gather(*(_deliver(sender, row, deadline, results) for row in rows))
+    await _record(db_pool, rows, results)
+    return len(rows)
+
+
+async def prune(db_pool):
+    """Drop delivered and dead rows older than OUTBOX_RETENTION_DAYS."""
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            """
+            DELETE FROM kazi_outbox
+            WHERE status <> 'pending' AND created_at < NOW() - make_interval(days => $1)
+            """,
+            OUTBOX_RETENTION_DAYS,
+        )
+
+
+async def delivery_loop(db_pool, sender, worker: int = 0):
+    pruned_at = 0.0
+    while not _stopping:
+        try:
+            _wake.clear()
+            claimed = await deliver_batch(db_pool, sender)
+            if claimed >= OUTBOX_BATCH_SIZE:
+                continue  # more waiting: go straight back for the next batch
+            if worker == 0 and time.monotonic() - pruned_at > 3600:
+                pruned_at = time.monotonic()
+                await prune(db_pool)
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("delivery loop error: %s", e, exc_info=True)
+            await asyncio.sleep(5)
+
+
+def start(db_pool, sender):
+    """Spawn the delivery loops. Must be called from inside the running event loop."""
+    global _stopping
+    if not db_pool:
+        return
+    _stopping = False
+    _tasks.extend(
+        asyncio.create_task(delivery_loop(db_pool, sender, i), name=f"outbox-{i}")
+        for i in range(OUTBOX_WORKERS)
+    )
+
+
+async def stop(timeout: float = 15.0):
+    """
+    Let each loop finish its current batch (up to `timeout`), then cancel.
+    Rows a cancelled batch had claimed are retried after their lease.
+    """
+    global _stopping
+    _stopping = True
+    wake()
+    if _tasks:
+        _, stuck = await asyncio.wait(_tasks, timeout=timeout)
+        for task in stuck:
+            task.cancel()
+        await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+def stats() -> dict:
+    return {**_stats, "workers": len(_tasks)}
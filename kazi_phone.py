@@ -0,0 +1,55 @@
+"""
+Kazi phone normalization.
+
+WhatsApp senders arrive as "whatsapp:+15551234567" and Stripe reports
+"+15551234567"; both normalize to the digits "15551234567". users stores
+that in an indexed phone_digits column so lookups across sources are exact
+equality instead of a LIKE '%...%' scan.
+"""
+
+import asyncio
+
+import kazi_log
+
+log = kazi_log.get_logger("db")
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def phone_digits(phone: str) -> str:
+    return "".join(filter(str.isdigit, phone or ""))
+
+
+async def _backfill_users(db_pool) -> int:
+    total = 0
+    while True:
+        async with db_pool.acquire() as conn:
+            result = await conn.execute(
+                """
+                UPDATE users SET phone_digits = regexp_replace(phone, '[^0-9]', '', 'g')
+                WHERE phone IN (
+                    SELECT phone FROM users
+                    WHERE phone_digits IS NULL
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                """,
+                BACKFILL_BATCH_SIZE,
+            )
+        updated = int(result.split()[-1])
+        total += updated
+        if updated < BACKFILL_BATCH_SIZE:
+            return total
+        await asyncio.sleep(0.1)  # let live traffic in between batches
+
+
+async def backfill_phone_digits(db_pool):
+    """Background task: fill phone_digits for rows written before the column existed."""
+    if not db_pool:
+        return
+    try:
+        users = await _backfill_users(db_pool)
+        if users:
+            log.info("phone_digits backfilled: %d users", users)
+    except Exception as e:
+        log.error("phone_digits backfill error: %s", e)
@@ -0,0 +1,200 @@
+"""
+Kazi reminder dispatcher.
+
+Due reminders are taken in batches with `FOR UPDATE SKIP LOCKED`, so
+replicas never grab the same row, and one statement marks them sent and
+writes their messages to kazi_outbox. Nothing here waits on Twilio: the
+outbox delivery workers send (and retry) the messages, so `sent` means
+"handed to the outbox", which can no longer lose it.
+
+Timing: instead of polling, each process keeps the next REMINDER_HORIZON_HOURS
+of pending reminders in an in-memory min-heap and sleeps exactly until the
+earliest one. `save_reminder` NOTIFYs on the `kazi_reminders` channel so a new
+near-term reminder wakes every replica immediately (the LISTEN side is
+kazi_notify's shared connection). While that connection is down the loop
+also polls for due reminders every REMINDER_POLL_SECONDS, since NOTIFYs are
+being missed. The heap is only a wake-up schedule — the `reminders` table
+stays the source of truth and the heap is rebuilt from it on startup, on
+every LISTEN (re)connect and every REMINDER_REFRESH_SECONDS.
+"""
+
+import os
+import heapq
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import kazi_log
+import kazi_notify
+import kazi_outbox
+
+log = kazi_log.get_logger("reminders")
+
+# ---------- Env ----------
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+REMINDER_HORIZON_HOURS = float(os.getenv("REMINDER_HORIZON_HOURS", "6"))
+REMINDER_HEAP_MAX = int(os.getenv("REMINDER_HEAP_MAX", "100000"))
+REMINDER_REFRESH_SECONDS = int(os.getenv("REMINDER_REFRESH_SECONDS", "300"))
+REMINDER_POLL_SECONDS = int(os.getenv("REMINDER_POLL_SECONDS", "30"))  # only while LISTEN is down
+
+NOTIFY_CHANNEL = "kazi_reminders"
+
+REMINDER_TEMPLATE = "⏰ REMINDER: {task}"
+
+
+# ---------- Dispatch ----------
+async def enqueue_due_reminders(db_pool, limit: int = REMINDER_BATCH_SIZE) -> int:
+    """
+    Mark up to `limit` due reminders sent and write their messages to the
+    outbox in one statement (so one transaction). Returns how many were queued.
+    """
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with db_pool.acquire() as conn:
+        return await conn.fetchval(
+            """
+            WITH due AS (
+                SELECT id FROM reminders
+                WHERE sent = FALSE AND remind_at <= $1
+                ORDER BY remind_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            ), marked AS (
+                UPDATE reminders r SET sent = TRUE
+                FROM due WHERE r.id = due.id
+                RETURNING r.user_phone, r.task, r.remind_at
+            ), queued AS (
+                INSERT INTO kazi_outbox (to_number, body, source, due_at)
+                SELECT user_phone, replace($3, '{task}', task), 'reminder', remind_at AT TIME ZONE 'UTC'
+                FROM marked
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM queued
+            """,
+            now_utc,
+            limit,
+            REMINDER_TEMPLATE,
+        )
+
+
+async def dispatch_due(db_pool) -> int:
+    """Queue every currently-due reminder, batch by batch. Returns how many were queued."""
+    if not db_pool:
+        return 0
+    total = 0
+    while True:
+        queued = await enqueue_due_reminders(db_pool)
+        total += queued
+        if queued:
+            kazi_outbox.wake()
+            log.info("queued %d reminders", queued)
+        if queued < REMINDER_BATCH_SIZE:
+            break
+    return total
+
+
+# ---------- Timer heap ----------
+# Entries are (remind_at naive UTC, reminder id).
+_heap: list = []
+_horizon_end = None
+_wake = asyncio.Event()
+_reload = True  # rebuild the heap on the next pass (startup, or NOTIFYs may have been missed)
+_listening = False  # kazi_notify's LISTEN connection is up; otherwise poll
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def load_horizon(db_pool):
+    """Rebuild the heap from every pending reminder due within the horizon."""
+    global _heap, _horizon_end
+    horizon_end = _utcnow() + timedelta(hours=REMINDER_HORIZON_HOURS)
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT id, remind_at FROM reminders
+            WHERE sent = FALSE AND remind_at <= $1
+            ORDER BY remind_at
+            LIMIT $2
+            """,
+            horizon_end,
+            REMINDER_HEAP_MAX,
+        )
+    heap = [(r["remind_at"], r["id"]) for r in rows]
+    heapq.heapify(heap)
+    _heap = heap
+    # A full page means later rows were cut off; only trust the heap up to the last one.
+    _horizon_end = rows[-1]["remind_at"] if len(rows) == REMINDER_HEAP_MAX else horizon_end
+
+
+async def notify_new_reminder(conn, reminder_id: int, remind_at: datetime):
+    """Wake every replica's scheduler for a freshly inserted reminder."""
+    await conn.execute(
+        "SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, f"{reminder_id}|{remind_at.isoformat()}"
+    )
+
+
+def _on_notify(conn, pid, channel, payload):
+    try:
+        rid, at = payload.split("|", 1)
+        remind_at = datetime.fromisoformat(at)
+    except ValueError:
+        log.warning("bad notify payload: %r", payload)
+        return
+    if _horizon_end is None or remind_at <= _horizon_end:
+        heapq.heappush(_heap, (remind_at, int(rid)))
+        _wake.set()
+
+
+def _on_listen_connected():
+    # Anything inserted while we weren't listening is picked up by the reload.
+    global _reload, _listening
+    _reload = True
+    _listening = True
+    _wake.set()
+
+
+def _on_listen_lost():
+    global _listening
+    _listening = False
+    _wake.set()
+
+
+kazi_notify.subscribe(NOTIFY_CHANNEL, _on_notify, on_connect=_on_listen_connected, on_lost=_on_listen_lost)
+
+
+async def reminder_loop(db_pool):
+    """Background task: sleep until the next reminder is due, then dispatch."""
+    log.info("reminder scheduler started")
+    if not db_pool:
+        return
+    global _reload
+    refresh_at = poll_at = _utcnow()
+    while True:
+        try:
+            _wake.clear()
+            now = _utcnow()
+            if _reload or now >= refresh_at:
+                _reload = False
+                await load_horizon(db_pool)
+                refresh_at = now + timedelta(seconds=REMINDER_REFRESH_SECONDS)
+            due = False
+            while _heap and _heap[0][0] <= now:
+                heapq.heappop(_heap)
+                due = True
+            if not _listening and now >= poll_at:
+                poll_at = now + timedelta(seconds=REMINDER_POLL_SECONDS)
+                due = True
+            if due:
+                await dispatch_due(db_pool)
+                continue
+            next_at = min(_heap[0][0], refresh_at) if _heap else refresh_at
+            if not _listening:
+                next_at = min(next_at, poll_at)
+            delay = max((next_at - _utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        except Exception as e:
+            log.error("reminder loop error: %s", e, exc_info=True)
+            await asyncio.sleep(5)
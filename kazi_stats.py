@@ -0,0 +1,162 @@
+"""
+Kazi stats — cheap /stats and a daily rollup table.
+
+The live summary is one aggregate query (COUNT ... FILTER) cached for
+STATS_TTL_SECONDS, so a polling dashboard hits the database at most once per
+TTL. Historical numbers come from kazi_daily_stats, which is maintained
+incrementally: hot paths call `bump()` (a dict increment), and `rollup_loop`
+adds the accumulated deltas to the day's row every STATS_FLUSH_SECONDS.
+
+Days are UTC everywhere. `mark_active` records each sender once per day in
+kazi_daily_active (remembered in-process so repeat messages skip the insert);
+that drives both the active_users rollup and active_today.
+"""
+
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import kazi_log
+
+log = kazi_log.get_logger("stats")
+
+# ---------- Env ----------
+STATS_TTL_SECONDS = float(os.getenv("STATS_TTL_SECONDS", "30"))
+STATS_FLUSH_SECONDS = float(os.getenv("STATS_FLUSH_SECONDS", "60"))
+STATS_ACTIVE_CACHE_MAX = int(os.getenv("STATS_ACTIVE_CACHE_MAX", "100000"))
+
+ROLLUP_COUNTERS = ("active_users", "messages", "reminders_sent", "gateway_calls")
+
+# (utc day, counter) -> delta not yet written to kazi_daily_stats
+_pending: dict = {}
+_summary_cache = {"at": 0.0, "value": None}
+# Senders already recorded in kazi_daily_active for `day`.
+_active = {"day": None, "phones": set()}
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date()
+
+
+def bump(counter: str, n: int = 1, day=None):
+    if n:
+        key = (day or utc_today(), counter)
+        _pending[key] = _pending.get(key, 0) + n
+
+
+async def mark_active(db_pool, phone: str):
+    """Count `phone` in today's active_users the first time it writes in (once across replicas)."""
+    day = utc_today()
+    if _active["day"] != day or len(_active["phones"]) >= STATS_ACTIVE_CACHE_MAX:
+        _active.update(day=day, phones=set())
+    phones = _active["phones"]
+    if phone in phones:
+        return
+    phones.add(phone)
+    if not db_pool:
+        bump("active_users", day=day)
+        return
+    try:
+        async with db_pool.acquire() as conn:
+            first = await conn.fetchval(
+                "INSERT INTO kazi_daily_active (day, phone) VALUES ($1, $2) ON CONFLICT DO NOTHING RETURNING 1",
+                day, phone,
+            )
+    except Exception as e:
+        phones.discard(phone)
+        log.error("mark_active error: %s", e)
+        return
+    if first:
+        bump("active_users", day=day)
+
+
+# ---------- Rollup ----------
+async def flush(db_pool):
+    """Add pending deltas to kazi_daily_stats in one statement; re-queue them on failure."""
+    global _pending
+    if not db_pool or not _pending:
+        return
+    pending, _pending = _pending, {}
+    days = sorted({day for day, _ in pending})
+    columns = {c: [pending.get((day, c), 0) for day in days] for c in ROLLUP_COUNTERS}
+    try:
+        async with db_pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO kazi_daily_stats AS s (day, active_users, messages, reminders_sent, gateway_calls)
+                SELECT * FROM unnest($1::date[], $2::int[], $3::int[], $4::int[], $5::int[])
+                ON CONFLICT (day) DO UPDATE SET
+                    active_users   = s.active_users   + EXCLUDED.active_users,
+                    messages       = s.messages       + EXCLUDED.messages,
+                    reminders_sent = s.reminders_sent + EXCLUDED.reminders_sent,
+                    gateway_calls  = s.gateway_calls  + EXCLUDED.gateway_calls
+                """,
+                days,
+                *(columns[c] for c in ROLLUP_COUNTERS),
+            )
+    except Exception:
+        for key, n in pending.items():
+            _pending[key] = _pending.get(key, 0) + n
+        raise
+
+
+async def prune_active(db_pool):
+    """Drop kazi_daily_active rows from before yesterday; their counts live in the rollup."""
+    async with db_pool.acquire() as conn:
+        await conn.execute(
+            "DELETE FROM kazi_daily_active WHERE day < (NOW() AT TIME ZONE 'UTC')::date - 1"
+        )
+
+
+async def rollup_loop(db_pool):
+    """Background task: write rollup deltas every STATS_FLUSH_SECONDS."""
+    if not db_pool:
+        return
+    pruned_at = 0.0
+    while True:
+        await asyncio.sleep(STATS_FLUSH_SECONDS)
+        try:
+            await flush(db_pool)
+            if time.monotonic() - pruned_at > 3600:
+                pruned_at = time.monotonic()
+                await prune_active(db_pool)
+        except Exception as e:
+            log.error("rollup flush error: %s", e)
+
+
+# ---------- Reads ----------
+async def summary(db_pool) -> dict:
+    """Current totals from one aggregate query, cached for STATS_TTL_SECONDS."""
+    now = time.monotonic()
+    if _summary_cache["value"] is not None and now - _summary_cache["at"] < STATS_TTL_SECONDS:
+        return _summary_cache["value"]
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT COUNT(*) AS total_users,
+                   COUNT(*) FILTER (WHERE plan = 'pro') AS pro_users,
+                   (SELECT COUNT(*) FROM kazi_daily_active
+                    WHERE day = (NOW() AT TIME ZONE 'UTC')::date) AS active_today,
+                   (SELECT COUNT(*) FROM reminders WHERE sent = FALSE) AS pending_reminders
+            FROM users
+            """
+        )
+    value = dict(row)
+    _summary_cache.update(at=now, value=value)
+    return value
+
+
+async def history(db_pool, days: int) -> list:
+    """Daily rollup rows for the last `days` days, oldest first."""
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT day, active_users, messages, reminders_sent, gateway_calls
+            FROM kazi_daily_stats
+            WHERE day > (NOW() AT TIME ZONE 'UTC')::date - $1::int
+            ORDER BY day
+            """,
+            days,
+        )
+    return [{**dict(r), "day": r["day"].isoformat()} for r in rows]
@@ -0,0 +1,288 @@
+"""
+Kazi outbound WhatsApp — rate-limited Twilio sender.
+
+Outgoing messages go through a `Sender`: a token bucket (TWILIO_SEND_RATE
+per second, bursts of TWILIO_SEND_BURST) paces POSTs for the sending number,
+and every other failure (429, 5xx, network errors, and 4xx that don't reject
+the message itself, such as a bad credential) is retried with backoff. 401/403
+are also logged as errors, since they need an operator. A 429's Retry-After
+also pauses the whole bucket, since the limit is per sender, not per message.
+
+`send()` returns a future that resolves to the Twilio message SID once the
+message is accepted, or raises DeliveryFailed after a message-level rejection
+(PERMANENT_ERROR_CODES), after its `max_attempts` tries, or when its deadline
+passes before it is sent.
+"""
+
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+import kazi_http
+import kazi_log
+from kazi_metrics import WHATSAPP_SEND_TOTAL
+
+log = kazi_log.get_logger("twilio")
+
+# ---------- Env ----------
+TWILIO_SEND_RATE = float(os.getenv("TWILIO_SEND_RATE", "20"))  # messages / second
+TWILIO_SEND_BURST = int(os.getenv("TWILIO_SEND_BURST", "20"))
+TWILIO_SEND_CONCURRENCY = int(os.getenv("TWILIO_SEND_CONCURRENCY", "10"))
+TWILIO_SEND_QUEUE_SIZE = int(os.getenv("TWILIO_SEND_QUEUE_SIZE", "10000"))
+TWILIO_MAX_ATTEMPTS = int(os.getenv("TWILIO_MAX_ATTEMPTS", "5"))
+TWILIO_BACKOFF_SECONDS = float(os.getenv("TWILIO_BACKOFF_SECONDS", "1"))
+TWILIO_MAX_BACKOFF_SECONDS = float(os.getenv("TWILIO_MAX_BACKOFF_SECONDS", "60"))
+
+# Twilio error codes (sent with HTTP 400) that reject the message itself.
+PERMANENT_ERROR_CODES = {
+    21211,  # invalid 'To' number
+    21214,  # 'To' number cannot be reached
+    21602,  # message body is required
+    21610,  # recipient replied STOP
+    21612,  # 'To' can't be reached from this 'From'
+    21614,  # 'To' is not a valid mobile number
+    21617,  # body exceeds the concatenated message limit
+}
+
+
+class DeliveryFailed(Exception):
+    def __init__(self, status, detail: str = "", code: int = None):
+        suffix = f", code {code}" if code else ""
+        super().__init__(f"Twilio send failed ({status}{suffix}): {detail}")
+        self.status = status
+        self.code = code
+
+    @property
+    def permanent(self) -> bool:
+        """Twilio rejected this message (bad number, opted out...); resending it can't succeed."""
+        return self.status == 400 and self.code in PERMANENT_ERROR_CODES
+
+    @property
+    def auth(self) -> bool:
+        """Twilio rejected our credentials; every message fails until they are fixed."""
+        return self.status in (401, 403)
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; waiters are served in arrival order."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hold every acquire for `seconds` and restart from an empty bucket."""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after(resp) -> float | None:
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_code(resp) -> int | None:
+    try:
+        return int(resp.json().get("code"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(TWILIO_MAX_BACKOFF_SECONDS, TWILIO_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class _Message:
+    __slots__ = ("to", "body", "future", "attempts", "max_attempts", "deadline", "request_id")
+
+    def __init__(self, to, body, future, max_attempts, deadline, request_id):
+        self.to = to
+        self.body = body
+        self.future = future
+        self.attempts = 0
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.request_id = request_id
+
+
+class Sender:
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 rate: float = TWILIO_SEND_RATE, burst: int = TWILIO_SEND_BURST,
+                 concurrency: int = TWILIO_SEND_CONCURRENCY, maxsize: int = TWILIO_SEND_QUEUE_SIZE,
+                 client: httpx.AsyncClient = None):
+        self.url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.auth = (account_sid, auth_token)
+        self.from_number = from_number
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+        self._client = client
+        self._queue = None
+        self._tasks = []
+        self._timers: dict = {}  # id(message) -> retry TimerHandle
+        self._pending: set = set()
+        self._stats = {"sent": 0, "retried": 0, "throttled": 0, "failed": 0, "rejected": 0, "auth_errors": 0,
+                       "expired": 0}
+
+    def start(self):
+        """Spawn the send workers. Must be called from inside the running event loop."""
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(self._queue), name=f"twilio-sender-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    def send(self, to: str, body: str, max_attempts: int = TWILIO_MAX_ATTEMPTS,
+             deadline: float = None) -> asyncio.Future:
+        """
+        Queue a message. The future resolves to the message SID or raises
+        DeliveryFailed. Callers that retry on their own (the outbox) pass
+        max_attempts=1. No POST starts after `deadline` (time.monotonic());
+        the message fails with status "expired" instead.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._queue is None or self._queue.qsize() >= self.maxsize:
+            self._stats["rejected"] += 1
+            future.set_exception(DeliveryFailed("queue", "send queue full or not started"))
+            return future
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        self._queue.put_nowait(_Message(to, body, future, max_attempts, deadline, kazi_log.REQUEST_ID.get()))
+        return future
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            msg = await queue.get()
+            try:
+                kazi_log.REQUEST_ID.set(msg.request_id)
+                await self.bucket.acquire()
+                if msg.deadline is not None and time.monotonic() > msg.deadline:
+                    self._stats["expired"] += 1
+                    self._fail(msg, DeliveryFailed("expired", "deadline passed before sending"))
+                else:
+                    await self._attempt(msg)
+            except Exception as e:
+                self._fail(msg, DeliveryFailed("error", str(e)))
+            finally:
+                queue.task_done()
+
+    async def _attempt(self, msg: _Message):
+        to, body, future = msg.to, msg.body, msg.future
+        if future.done():
+            return
+        msg.attempts = attempts = msg.attempts + 1
+        client = self._client or kazi_http.client_for(self.url)
+        try:
+            resp = await client.post(self.url, auth=self.auth, data={"From": self.from_number, "To": to, "Body": body})
+        except httpx.HTTPError as e:
+            return self._retry(msg, _backoff(attempts), DeliveryFailed("network", str(e)))
+        if resp.status_code < 300:
+            self._stats["sent"] += 1
+            WHATSAPP_SEND_TOTAL.inc("sent")
+            log.info("whatsapp sent to %s", to, extra=kazi_log.sample(0.1))
+            future.set_result(resp.json().get("sid"))
+        elif resp.status_code == 429:
+            self._stats["throttled"] += 1
+            delay = _retry_after(resp)
+            delay = _backoff(attempts) if delay is None else delay
+            self.bucket.pause(delay)
+            self._retry(msg, delay, DeliveryFailed(429, resp.text[:200], _error_code(resp)))
+        elif resp.status_code >= 500:
+            delay = _retry_after(resp)
+            self._retry(msg, _backoff(attempts) if delay is None else delay,
+                        DeliveryFailed(resp.status_code, resp.text[:200]))
+        else:
+            error = DeliveryFailed(resp.status_code, resp.text[:200], _error_code(resp))
+            if error.permanent:
+                return self._fail(msg, error)
+            if error.auth:
+                self._stats["auth_errors"] += 1
+                log.error("Twilio rejected our credentials (HTTP %s) — check TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN",
+                          resp.status_code)
+            self._retry(msg, _backoff(attempts), error)
+
+    def _retry(self, msg: _Message, delay: float, error: DeliveryFailed):
+        """Try again after `delay`, or fail with `error` once the attempts are used up."""
+        if msg.attempts >= msg.max_attempts:
+            return self._fail(msg, error)
+        self._stats["retried"] += 1
+        WHATSAPP_SEND_TOTAL.inc("retried")
+        log.warning("whatsapp send to %s: %s, retrying in %.1fs", msg.to, error, delay)
+        self._timers[id(msg)] = asyncio.get_running_loop().call_later(delay, self._requeue, msg)
+
+    def _requeue(self, msg: _Message):
+        self._timers.pop(id(msg), None)
+        if self._queue is not None:
+            self._queue.put_nowait(msg)
+        else:
+            self._fail(msg, DeliveryFailed("shutdown", "sender stopped before retry"))
+
+    def _fail(self, msg: _Message, error: DeliveryFailed):
+        future = msg.future
+        if future.done():
+            return
+        self._stats["failed"] += 1
+        WHATSAPP_SEND_TOTAL.inc("failed")
+        log.warning("whatsapp send to %s failed: %s", msg.to, error)
+        future.set_exception(error)
+
+    async def close(self, timeout: float = 15.0):
+        """Wait up to `timeout` for queued and retrying messages, then fail the rest and stop."""
+        if self._pending:
+            await asyncio.wait(set(self._pending), timeout=timeout)
+        queue, self._queue = self._queue, None
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for future in list(self._pending):
+            if not future.done():
+                future.set_exception(DeliveryFailed("shutdown", "sender stopped"))
+        if queue is not None and queue.qsize():
+            log.warning("twilio sender stopped with %d messages queued", queue.qsize())
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._pending),
+            "rate_per_second": self.bucket.rate,
+        }
+
@@ -0,0 +1,138 @@
+"""
+Kazi timezone resolution.
+
+`resolve_tz` maps free text ("I'm in new york", "cet", "Tokyo") to an IANA zone.
+TZ_MAP keys are indexed in a word-level trie, so a lookup is one pass over the
+message's words with whole-word matches only ("la" no longer hits "atlanta")
+and the longest phrase wins ("new york" beats "ny"; "south korea" beats "korea").
+ZoneInfo objects are memoized in `get_zone`, shared by every caller.
+"""
+
+import string
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+TZ_MAP = {
+    "usa": "America/Chicago", "us": "America/Chicago", "america": "America/New_York",
+    "new york": "America/New_York", "nyc": "America/New_York", "ny": "America/New_York",
+    "los angeles": "America/Los_Angeles", "la": "America/Los_Angeles", "california": "America/Los_Angeles",
+    "chicago": "America/Chicago", "texas": "America/Chicago", "houston": "America/Chicago", "dallas": "America/Chicago",
+    "denver": "America/Denver", "phoenix": "America/Phoenix", "seattle": "America/Los_Angeles",
+    "miami": "America/New_York", "boston": "America/New_York", "atlanta": "America/New_York",
+    "cst": "America/Chicago", "central": "America/Chicago",
+    "est": "America/New_York", "eastern": "America/New_York",
+    "pst": "America/Los_Angeles", "pacific": "America/Los_Angeles",
+    "mst": "America/Denver", "mountain": "America/Denver",
+    "uk": "Europe/London", "england": "Europe/London", "london": "Europe/London", "britain": "Europe/London",
+    "gmt": "Europe/London", "bst": "Europe/London",
+    "germany": "Europe/Berlin", "berlin": "Europe/Berlin", "munich": "Europe/Berlin", "frankfurt": "Europe/Berlin",
+    "france": "Europe/Paris", "paris": "Europe/Paris",
+    "spain": "Europe/Madrid", "madrid": "Europe/Madrid", "barcelona": "Europe/Madrid",
+    "italy": "Europe/Rome", "rome": "Europe/Rome", "milan": "Europe/Rome",
+    "netherlands": "Europe/Amsterdam", "amsterdam": "Europe/Amsterdam", "holland": "Europe/Amsterdam",
+    "belgium": "Europe/Brussels", "brussels": "Europe/Brussels",
+    "sweden": "Europe/Stockholm", "stockholm": "Europe/Stockholm",
+    "norway": "Europe/Oslo", "oslo": "Europe/Oslo",
+    "denmark": "Europe/Copenhagen", "copenhagen": "Europe/Copenhagen",
+    "finland": "Europe/Helsinki", "helsinki": "Europe/Helsinki",
+    "poland": "Europe/Warsaw", "warsaw": "Europe/Warsaw",
+    "austria": "Europe/Vienna", "vienna": "Europe/Vienna",
+    "switzerland": "Europe/Zurich", "zurich": "Europe/Zurich", "geneva": "Europe/Zurich",
+    "portugal": "Europe/Lisbon", "lisbon": "Europe/Lisbon",
+    "ireland": "Europe/Dublin", "dublin": "Europe/Dublin",
+    "greece": "Europe/Athens", "athens": "Europe/Athens",
+    "cet": "Europe/Paris", "cest": "Europe/Paris",
+    "japan": "Asia/Tokyo", "tokyo": "Asia/Tokyo", "jst": "Asia/Tokyo",
+    "china": "Asia/Shanghai", "shanghai": "Asia/Shanghai", "beijing": "Asia/Shanghai",
+    "hong kong": "Asia/Hong_Kong", "hongkong": "Asia/Hong_Kong",
+    "singapore": "Asia/Singapore",
+    "korea": "Asia/Seoul", "seoul": "Asia/Seoul", "south korea": "Asia/Seoul",
+    "india": "Asia/Kolkata", "mumbai": "Asia/Kolkata", "delhi": "Asia/Kolkata", "bangalore": "Asia/Kolkata", "ist": "Asia/Kolkata",
+    "thailand": "Asia/Bangkok", "bangkok": "Asia/Bangkok",
+    "vietnam": "Asia/Ho_Chi_Minh", "hanoi": "Asia/Ho_Chi_Minh",
+    "indonesia": "Asia/Jakarta", "jakarta": "Asia/Jakarta",
+    "malaysia": "Asia/Kuala_Lumpur", "kuala lumpur": "Asia/Kuala_Lumpur",
+    "philippines": "Asia/Manila", "manila": "Asia/Manila",
+    "taiwan": "Asia/Taipei", "taipei": "Asia/Taipei",
+    "uae": "Asia/Dubai", "dubai": "Asia/Dubai", "abu dhabi": "Asia/Dubai",
+    "saudi": "Asia/Riyadh", "saudi arabia": "Asia/Riyadh", "riyadh": "Asia/Riyadh",
+    "israel": "Asia/Jerusalem", "tel aviv": "Asia/Jerusalem", "jerusalem": "Asia/Jerusalem",
+    "turkey": "Europe/Istanbul", "istanbul": "Europe/Istanbul",
+    "russia": "Europe/Moscow", "moscow": "Europe/Moscow",
+    "australia": "Australia/Sydney", "sydney": "Australia/Sydney", "melbourne": "Australia/Melbourne",
+    "brisbane": "Australia/Brisbane", "perth": "Australia/Perth", "aest": "Australia/Sydney",
+    "new zealand": "Pacific/Auckland", "auckland": "Pacific/Auckland", "nz": "Pacific/Auckland",
+    "brazil": "America/Sao_Paulo", "sao paulo": "America/Sao_Paulo", "rio": "America/Sao_Paulo",
+    "mexico": "America/Mexico_City", "mexico city": "America/Mexico_City",
+    "canada": "America/Toronto", "toronto": "America/Toronto", "vancouver": "America/Vancouver",
+    "argentina": "America/Buenos_Aires", "buenos aires": "America/Buenos_Aires",
+    "south africa": "Africa/Johannesburg", "johannesburg": "Africa/Johannesburg",
+    "nigeria": "Africa/Lagos", "lagos": "Africa/Lagos",
+    "kenya": "Africa/Nairobi", "nairobi": "Africa/Nairobi",
+    "egypt": "Africa/Cairo", "cairo": "Africa/Cairo",
+    "utc": "UTC",
+}
+
+# Punctuation and digits split words, same as whitespace ("i'm" -> "i", "m").
+_SEPARATORS = str.maketrans({c: " " for c in string.punctuation + string.digits})
+_END = object()  # trie key marking a complete phrase
+
+
+def _words(text: str) -> list:
+    return text.translate(_SEPARATORS).split()
+
+
+def _build_trie(mapping: dict) -> dict:
+    root = {}
+    for phrase, tz_name in mapping.items():
+        node = root
+        for word in _words(phrase):
+            node = node.setdefault(word, {})
+        node[_END] = tz_name
+    return root
+
+
+_TZ_TRIE = _build_trie(TZ_MAP)
+
+
+def _longest_match(words: list):
+    """Longest TZ_MAP phrase found on word boundaries; the earliest wins a tie."""
+    best_len, best_tz = 0, None
+    n = len(words)
+    for i, word in enumerate(words):
+        node = _TZ_TRIE.get(word)
+        j = i
+        while node is not None:
+            if _END in node and j - i + 1 > best_len:
+                best_len, best_tz = j - i + 1, node[_END]
+            j += 1
+            node = node.get(words[j]) if j < n else None
+    return best_tz
+
+
+@lru_cache(maxsize=1024)
+def get_zone(tz_name: str):
+    """Memoized ZoneInfo lookup. Returns None for unknown or malformed names."""
+    try:
+        return ZoneInfo(tz_name)
+    except Exception:
+        return None
+
+
+def resolve_tz(text):
+    text = text.lower().strip()
+    if text in TZ_MAP:
+        return TZ_MAP[text]
+    match = _longest_match(_words(text))
+    if match:
+        return match
+    if text and get_zone(text):
+        return text
+    return None
+
+
+def get_local_time(tz_name):
+    tz = get_zone(tz_name) if tz_name else None
+    return datetime.now(tz or timezone.utc)
+
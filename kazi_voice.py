@@ -0,0 +1,94 @@
+"""
+Kazi voice notes — stream Twilio media into memory and transcribe with Whisper.
+
+No temp files: the audio is buffered in memory (capped at VOICE_MAX_BYTES) and
+handed straight to the async OpenAI client, so concurrent voice notes can't
+overwrite each other. Concurrency is bounded by the caller: main transcribes
+on its own "voice" JobQueue with VOICE_MAX_CONCURRENCY workers, apart from the
+inbound workers, so a burst of voice notes can't starve text traffic.
+
+Like kazi_llm, the openai SDK is imported lazily (or warmed up after startup).
+"""
+
+import os
+import time
+import asyncio
+
+import kazi_http
+import kazi_log
+from kazi_metrics import stage
+
+# ---------- Env ----------
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "whisper-1")
+VOICE_MAX_BYTES = int(os.getenv("VOICE_MAX_BYTES", str(25 * 1024 * 1024)))  # Whisper's upload limit
+VOICE_MAX_CONCURRENCY = int(os.getenv("VOICE_MAX_CONCURRENCY", "4"))
+VOICE_TIMEOUT_SECONDS = float(os.getenv("VOICE_TIMEOUT_SECONDS", "60"))
+
+log = kazi_log.get_logger("voice")
+
+_openai_client = None
+
+_EXTENSIONS = {
+    "audio/ogg": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+    "audio/amr": "amr",
+    "audio/wav": "wav",
+    "audio/webm": "webm",
+}
+
+
+def get_client():
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=VOICE_TIMEOUT_SECONDS)
+    return _openai_client
+
+
+async def warm_up():
+    """Import the SDK and build the client off the event loop."""
+    await asyncio.to_thread(get_client)
+
+
+class AudioTooLarge(Exception):
+    pass
+
+
+async def download_media(media_url: str) -> bytes:
+    """Stream a Twilio media URL into memory, aborting past VOICE_MAX_BYTES."""
+    chunks = []
+    size = 0
+    client = kazi_http.client_for(media_url)
+    async with client.stream(
+        "GET", media_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), follow_redirects=True
+    ) as resp:
+        resp.raise_for_status()
+        declared = resp.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > VOICE_MAX_BYTES:
+            raise AudioTooLarge(f"media is {declared} bytes (cap {VOICE_MAX_BYTES})")
+        async for chunk in resp.aiter_bytes():
+            size += len(chunk)
+            if size > VOICE_MAX_BYTES:
+                raise AudioTooLarge(f"media exceeds {VOICE_MAX_BYTES} bytes")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def transcribe_audio(media_url: str, content_type: str = "audio/ogg") -> str:
+    """Download and transcribe a voice note."""
+    started = time.perf_counter()
+    with stage("media_download"):
+        audio = await download_media(media_url)
+    log.info("audio downloaded: %d bytes in %.0fms", len(audio), (time.perf_counter() - started) * 1000)
+    ext = _EXTENSIONS.get((content_type or "").split(";")[0].strip(), "ogg")
+    with stage("whisper"):
+        transcript = await get_client().audio.transcriptions.create(
+            model=WHISPER_MODEL,
+            file=(f"voice.{ext}", audio, content_type or "audio/ogg"),
+        )
+    log.debug("transcription: %s", transcript.text)
+    return transcript.text
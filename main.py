@@ -1,23 +1,35 @@
 import os
 import json
-import httpx
 import asyncio
-import traceback
-from datetime import datetime, timezone, date, timedelta
-from zoneinfo import ZoneInfo
+from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Form, Request
 from fastapi.responses import Response, HTMLResponse, FileResponse, JSONResponse
-import anthropic
-from openai import OpenAI
 import asyncpg
 
 import kazi_gateway
+import kazi_http
+import kazi_llm
+import kazi_voice
+import kazi_reminders
+import kazi_jobs
+import kazi_log
+import kazi_migrations
+import kazi_notify
+import kazi_stats
+import kazi_twilio
+import kazi_outbox
+import kazi_dedup
+import kazi_intents
+import kazi_metrics
+from kazi_metrics import PATH, MESSAGES_TOTAL, stage
+from kazi_phone import phone_digits, backfill_phone_digits
+from kazi_tz import resolve_tz, get_local_time, get_zone
+
+log = kazi_log.get_logger("main")
 
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 AIFREDO_API_URL = os.getenv("AIFREDO_API_URL", "https://aifredo.chat")
@@ -25,71 +37,19 @@ KAZI_AIFREDO_SECRET = os.getenv("KAZI_AIFREDO_SECRET", "")
 
 STRIPE_PAYMENT_LINK = "https://buy.stripe.com/eVq3cwbT71Cs67T63U4ZG01"
 FREE_DAILY_MESSAGES = 10
+INBOUND_WORKERS = int(os.getenv("INBOUND_WORKERS", "32"))
+INBOUND_QUEUE_SIZE = int(os.getenv("INBOUND_QUEUE_SIZE", "2000"))
+INBOUND_MAILBOX_MAX = int(os.getenv("INBOUND_MAILBOX_MAX", "20"))
+VOICE_QUEUE_SIZE = int(os.getenv("VOICE_QUEUE_SIZE", "200"))
+COALESCE_STANDALONE_MS = int(os.getenv("COALESCE_STANDALONE_MS", "0"))  # 0 = off
 
-claude = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 db_pool = None
-
-TZ_MAP = {
-    "usa": "America/Chicago", "us": "America/Chicago", "america": "America/New_York",
-    "new york": "America/New_York", "nyc": "America/New_York", "ny": "America/New_York",
-    "los angeles": "America/Los_Angeles", "la": "America/Los_Angeles", "california": "America/Los_Angeles",
-    "chicago": "America/Chicago", "texas": "America/Chicago", "houston": "America/Chicago", "dallas": "America/Chicago",
-    "denver": "America/Denver", "phoenix": "America/Phoenix", "seattle": "America/Los_Angeles",
-    "miami": "America/New_York", "boston": "America/New_York", "atlanta": "America/New_York",
-    "cst": "America/Chicago", "central": "America/Chicago",
-    "est": "America/New_York", "eastern": "America/New_York",
-    "pst": "America/Los_Angeles", "pacific": "America/Los_Angeles",
-    "mst": "America/Denver", "mountain": "America/Denver",
-    "uk": "Europe/London", "england": "Europe/London", "london": "Europe/London", "britain": "Europe/London",
-    "gmt": "Europe/London", "bst": "Europe/London",
-    "germany": "Europe/Berlin", "berlin": "Europe/Berlin", "munich": "Europe/Berlin", "frankfurt": "Europe/Berlin",
-    "france": "Europe/Paris", "paris": "Europe/Paris",
-    "spain": "Europe/Madrid", "madrid": "Europe/Madrid", "barcelona": "Europe/Madrid",
-    "italy": "Europe/Rome", "rome": "Europe/Rome", "milan": "Europe/Rome",
-    "netherlands": "Europe/Amsterdam", "amsterdam": "Europe/Amsterdam", "holland": "Europe/Amsterdam",
-    "belgium": "Europe/Brussels", "brussels": "Europe/Brussels",
-    "sweden": "Europe/Stockholm", "stockholm": "Europe/Stockholm",
-    "norway": "Europe/Oslo", "oslo": "Europe/Oslo",
-    "denmark": "Europe/Copenhagen", "copenhagen": "Europe/Copenhagen",
-    "finland": "Europe/Helsinki", "helsinki": "Europe/Helsinki",
-    "poland": "Europe/Warsaw", "warsaw": "Europe/Warsaw",
-    "austria": "Europe/Vienna", "vienna": "Europe/Vienna",
-    "switzerland": "Europe/Zurich", "zurich": "Europe/Zurich", "geneva": "Europe/Zurich",
-    "portugal": "Europe/Lisbon", "lisbon": "Europe/Lisbon",
-    "ireland": "Europe/Dublin", "dublin": "Europe/Dublin",
-    "greece": "Europe/Athens", "athens": "Europe/Athens",
-    "cet": "Europe/Paris", "cest": "Europe/Paris",
-    "japan": "Asia/Tokyo", "tokyo": "Asia/Tokyo", "jst": "Asia/Tokyo",
-    "china": "Asia/Shanghai", "shanghai": "Asia/Shanghai", "beijing": "Asia/Shanghai",
-    "hong kong": "Asia/Hong_Kong", "hongkong": "Asia/Hong_Kong",
-    "singapore": "Asia/Singapore",
-    "korea": "Asia/Seoul", "seoul": "Asia/Seoul", "south korea": "Asia/Seoul",
-    "india": "Asia/Kolkata", "mumbai": "Asia/Kolkata", "delhi": "Asia/Kolkata", "bangalore": "Asia/Kolkata", "ist": "Asia/Kolkata",
-    "thailand": "Asia/Bangkok", "bangkok": "Asia/Bangkok",
-    "vietnam": "Asia/Ho_Chi_Minh", "hanoi": "Asia/Ho_Chi_Minh",
-    "indonesia": "Asia/Jakarta", "jakarta": "Asia/Jakarta",
-    "malaysia": "Asia/Kuala_Lumpur", "kuala lumpur": "Asia/Kuala_Lumpur",
-    "philippines": "Asia/Manila", "manila": "Asia/Manila",
-    "taiwan": "Asia/Taipei", "taipei": "Asia/Taipei",
-    "uae": "Asia/Dubai", "dubai": "Asia/Dubai", "abu dhabi": "Asia/Dubai",
-    "saudi": "Asia/Riyadh", "saudi arabia": "Asia/Riyadh", "riyadh": "Asia/Riyadh",
-    "israel": "Asia/Jerusalem", "tel aviv": "Asia/Jerusalem", "jerusalem": "Asia/Jerusalem",
-    "turkey": "Europe/Istanbul", "istanbul": "Europe/Istanbul",
-    "russia": "Europe/Moscow", "moscow": "Europe/Moscow",
-    "australia": "Australia/Sydney", "sydney": "Australia/Sydney", "melbourne": "Australia/Melbourne",
-    "brisbane": "Australia/Brisbane", "perth": "Australia/Perth", "aest": "Australia/Sydney",
-    "new zealand": "Pacific/Auckland", "auckland": "Pacific/Auckland", "nz": "Pacific/Auckland",
-    "brazil": "America/Sao_Paulo", "sao paulo": "America/Sao_Paulo", "rio": "America/Sao_Paulo",
-    "mexico": "America/Mexico_City", "mexico city": "America/Mexico_City",
-    "canada": "America/Toronto", "toronto": "America/Toronto", "vancouver": "America/Vancouver",
-    "argentina": "America/Buenos_Aires", "buenos aires": "America/Buenos_Aires",
-    "south africa": "Africa/Johannesburg", "johannesburg": "Africa/Johannesburg",
-    "nigeria": "Africa/Lagos", "lagos": "Africa/Lagos",
-    "kenya": "Africa/Nairobi", "nairobi": "Africa/Nairobi",
-    "egypt": "Africa/Cairo", "cairo": "Africa/Cairo",
-    "utc": "UTC",
-}
+inbound_jobs = kazi_jobs.JobQueue("inbound", INBOUND_WORKERS, INBOUND_QUEUE_SIZE)
+# Messages from one sender are handled one at a time, in arrival order.
+inbound_mailboxes = kazi_jobs.Mailboxes(inbound_jobs, max_pending=INBOUND_MAILBOX_MAX)
+# Voice notes are transcribed on their own few workers, so a burst of them can't hold the inbound ones.
+voice_jobs = kazi_jobs.JobQueue("voice", kazi_voice.VOICE_MAX_CONCURRENCY, VOICE_QUEUE_SIZE)
+voice_mailboxes = kazi_jobs.Mailboxes(voice_jobs, max_pending=INBOUND_MAILBOX_MAX)
 
 WELCOME_MSG = """Hi! I'm Kazi, your AI assistant on WhatsApp. I help you get things done with voice and text.
 
@@ -135,9 +95,13 @@ Kazi Pro — $5/month
 
 Upgrade → {STRIPE_PAYMENT_LINK}"""
 
+BUSY_MSG = "Kazi is a bit busy right now. Please try again in a minute."
+
+# Static instructions only, so the prefix is identical on every call and can be
+# prompt-cached; the per-user time goes in KAZI_CONTEXT, sent as a trailing block.
 KAZI_SYSTEM = """You are Kazi, a helpful AI assistant via WhatsApp. Keep responses short and friendly.
 
-CURRENT TIME: {current_time} (User's local timezone: {timezone})
+The user's current local time and timezone are given at the end of these instructions.
 
 REMINDERS - VERY IMPORTANT:
 When user asks for a reminder, you MUST:
@@ -157,165 +121,135 @@ Example: If current time is 08:17 and user asks for "8:45 AM", that's TODAY (28
 
 TIMEZONE: If user mentions their location or timezone, just say "Let me update your timezone" - the system handles it.
 
-TIME QUERIES: If user asks "what time is it", tell them: {current_time}
+TIME QUERIES: If user asks "what time is it", tell them the CURRENT TIME below.
 
 INVITE: If user wants to share Kazi:
 "Hey! Try Kazi - an AI assistant on WhatsApp: https://wa.me/15734125273?text=Hi%20Kazi"
 """
 
+KAZI_CONTEXT = "CURRENT TIME: {current_time} (User's local timezone: {timezone})"
+
 async def init_db():
     global db_pool
     if DATABASE_URL:
         db_pool = await asyncpg.create_pool(DATABASE_URL)
-        async with db_pool.acquire() as conn:
-            await conn.execute("CREATE TABLE IF NOT EXISTS reminders (id SERIAL PRIMARY KEY, user_phone VARCHAR(50) NOT NULL, task TEXT NOT NULL, remind_at TIMESTAMP NOT NULL, sent BOOLEAN DEFAULT FALSE)")
-            await conn.execute("CREATE TABLE IF NOT EXISTS users (phone VARCHAR(50) PRIMARY KEY, timezone VARCHAR(50) DEFAULT NULL, welcomed BOOLEAN DEFAULT FALSE, plan VARCHAR(20) DEFAULT 'free', messages_today INT DEFAULT 0, last_message_date DATE DEFAULT CURRENT_DATE, stripe_customer_id VARCHAR(100) DEFAULT NULL)")
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN welcomed BOOLEAN DEFAULT FALSE")
-            except:
-                pass
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN plan VARCHAR(20) DEFAULT 'free'")
-            except:
-                pass
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN messages_today INT DEFAULT 0")
-            except:
-                pass
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN last_message_date DATE DEFAULT CURRENT_DATE")
-            except:
-                pass
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN stripe_customer_id VARCHAR(100) DEFAULT NULL")
-            except:
-                pass
-        await kazi_gateway.init_gateway_schema(db_pool)
-        print("DB ready")
+        await kazi_migrations.migrate(db_pool)
+        log.info("DB ready")
 
 async def close_db():
     if db_pool:
         await db_pool.close()
 
-async def get_user(phone):
-    if db_pool:
-        async with db_pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT timezone, welcomed, plan, messages_today, last_message_date FROM users WHERE phone = $1", phone)
-            if row:
-                return dict(row)
-            await conn.execute("INSERT INTO users (phone, welcomed, plan, messages_today, last_message_date) VALUES ($1, FALSE, 'free', 0, CURRENT_DATE) ON CONFLICT DO NOTHING", phone)
-            return {"timezone": None, "welcomed": False, "plan": "free", "messages_today": 0, "last_message_date": date.today()}
-    return {"timezone": None, "welcomed": False, "plan": "free", "messages_today": 0, "last_message_date": date.today()}
-
-async def increment_message_count(phone):
+async def touch_user(phone):
+    """
+    Upsert the user, count this message and mark them welcomed in one statement.
+    Returns their state with the post-increment count (and whether they had been
+    welcomed before), or None if a free user has already hit today's quota.
+    """
     if db_pool:
-        async with db_pool.acquire() as conn:
-            result = await conn.fetchrow("""
-                UPDATE users 
-                SET messages_today = CASE 
-                    WHEN last_message_date = CURRENT_DATE THEN messages_today + 1 
-                    ELSE 1 
-                END,
-                last_message_date = CURRENT_DATE
-                WHERE phone = $1
-                RETURNING messages_today
-            """, phone)
-            return result["messages_today"] if result else 1
-    return 1
+        with stage("db"):
+            async with db_pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                WITH prev AS (
+                    SELECT welcomed FROM users WHERE phone = $1
+                ), up AS (
+                    INSERT INTO users (phone, phone_digits, welcomed, plan, messages_today, last_message_date)
+                    VALUES ($1, $3, TRUE, 'free', 1, CURRENT_DATE)
+                    ON CONFLICT (phone) DO UPDATE
+                    SET messages_today = CASE 
+                        WHEN users.last_message_date = CURRENT_DATE THEN COALESCE(users.messages_today, 0) + 1 
+                        ELSE 1 
+                    END,
+                    last_message_date = CURRENT_DATE,
+                    welcomed = TRUE
+                    WHERE users.plan <> 'free'
+                       OR users.last_message_date IS DISTINCT FROM CURRENT_DATE
+                       OR COALESCE(users.messages_today, 0) < $2
+                    RETURNING timezone, plan, messages_today
+                )
+                SELECT up.timezone, up.plan, up.messages_today,
+                       COALESCE((SELECT welcomed FROM prev), FALSE) AS welcomed
+                FROM up
+            """, phone, FREE_DAILY_MESSAGES, phone_digits(phone))
+        return dict(row) if row else None
+    return {"timezone": None, "welcomed": False, "plan": "free", "messages_today": 1}
 
 async def set_user_tz(phone, tz_name):
     if db_pool:
         async with db_pool.acquire() as conn:
             await conn.execute("UPDATE users SET timezone = $1, welcomed = TRUE WHERE phone = $2", tz_name, phone)
 
-async def set_user_welcomed(phone):
-    if db_pool:
-        async with db_pool.acquire() as conn:
-            await conn.execute("UPDATE users SET welcomed = TRUE WHERE phone = $1", phone)
-
 async def upgrade_user(phone):
     if db_pool:
         async with db_pool.acquire() as conn:
             await conn.execute("UPDATE users SET plan = 'pro' WHERE phone = $1", phone)
 
-def resolve_tz(text):
-    text = text.lower().strip()
-    if text in TZ_MAP:
-        return TZ_MAP[text]
-    for key, tz in TZ_MAP.items():
-        if key in text or text in key:
-            return tz
-    try:
-        ZoneInfo(text)
-        return text
-    except:
-        pass
-    return None
-
-def get_local_time(tz_name):
-    try:
-        tz = ZoneInfo(tz_name)
-        return datetime.now(tz)
-    except:
-        return datetime.now(timezone.utc)
+whatsapp_sender = kazi_twilio.Sender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, "whatsapp:+15734125273")
 
 async def send_whatsapp(to, body):
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
-    async with httpx.AsyncClient() as client:
-        await client.post(url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), data={"From": "whatsapp:+15734125273", "To": to, "Body": body})
-
-async def check_reminders():
-    print("Reminder checker started")
-    while True:
-        try:
-            if db_pool:
-                async with db_pool.acquire() as conn:
-                    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
-                    rows = await conn.fetch("SELECT id, user_phone, task FROM reminders WHERE remind_at <= $1 AND sent = FALSE", now_utc)
-                    for r in rows:
-                        await send_whatsapp(r["user_phone"], f"⏰ REMINDER: {r['task']}")
-                        await conn.execute("UPDATE reminders SET sent = TRUE WHERE id = $1", r["id"])
-                        print(f"Sent: {r['task']}")
-        except Exception as e:
-            print(f"Checker error: {e}")
-        await asyncio.sleep(30)
+    """Queue a message in the outbox; kazi_outbox's workers deliver it through whatsapp_sender."""
+    if not db_pool:
+        return await whatsapp_sender.send(to, body)
+    with stage("send_whatsapp"):
+        await kazi_outbox.send(db_pool, to, body, PATH.get())
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    asyncio.create_task(check_reminders())
-    asyncio.create_task(kazi_gateway.scheduled_loop(db_pool, send_whatsapp))
+    whatsapp_sender.start()
+    inbound_jobs.start()
+    voice_jobs.start()
+    # Import the LLM/Whisper SDKs in the background once we're serving.
+    warm_up = asyncio.gather(kazi_llm.warm_up(), kazi_voice.warm_up(), return_exceptions=True)
+    kazi_outbox.start(db_pool, whatsapp_sender)
+    reminder_task = asyncio.create_task(kazi_reminders.reminder_loop(db_pool))
+    asyncio.create_task(kazi_gateway.scheduled_loop(db_pool))
+    notify_task = asyncio.create_task(kazi_notify.listen_loop(DATABASE_URL))
+    rollup_task = asyncio.create_task(kazi_stats.rollup_loop(db_pool))
+    backfill_task = asyncio.create_task(backfill_phone_digits(db_pool))
+    dedup_task = asyncio.create_task(kazi_dedup.prune_loop(db_pool))
     yield
+    await warm_up
+    await voice_jobs.drain()
+    # From here on the coalescer is disabled, so inbound jobs still draining answer directly.
+    await standalone_coalescer.flush_all()
+    await inbound_jobs.drain()
+    await kazi_gateway.drain_routing()
+    reminder_task.cancel()
+    notify_task.cancel()
+    rollup_task.cancel()
+    backfill_task.cancel()
+    dedup_task.cancel()
+    try:
+        await kazi_stats.flush(db_pool)
+    except Exception as e:
+        log.error("final stats flush error: %s", e)
+    await asyncio.gather(notify_task, return_exceptions=True)
+    await kazi_outbox.stop()
+    await whatsapp_sender.close()
+    await kazi_http.close_clients()
     await close_db()
+    kazi_log.shutdown()
 
 app = FastAPI(title="Kazi", lifespan=lifespan)
 
-async def transcribe_audio(media_url):
-    print(f"Transcribing audio: {media_url}")
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        resp = await client.get(media_url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
-        print(f"Audio download status: {resp.status_code}, size: {len(resp.content)}")
-    with open("/tmp/voice.ogg", "wb") as f:
-        f.write(resp.content)
-    with open("/tmp/voice.ogg", "rb") as f:
-        transcript = openai_client.audio.transcriptions.create(model="whisper-1", file=f)
-    print(f"Transcription: {transcript.text}")
-    return transcript.text
-
 async def save_reminder(user_phone, task, hour, minute, tz_name):
+    tz = (get_zone(tz_name) if tz_name else None) or timezone.utc
+    now_local = datetime.now(tz)
+    remind_local = now_local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if remind_local <= now_local:
+        remind_local = remind_local + timedelta(days=1)
+    return await save_reminder_at(user_phone, task, remind_local)
+
+async def save_reminder_at(user_phone, task, remind_local):
+    """Store a reminder for an aware local datetime."""
     if db_pool:
-        try:
-            tz = ZoneInfo(tz_name) if tz_name else timezone.utc
-        except:
-            tz = timezone.utc
-        now_local = datetime.now(tz)
-        remind_local = now_local.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        if remind_local <= now_local:
-            remind_local = remind_local + timedelta(days=1)
         remind_utc = remind_local.astimezone(timezone.utc).replace(tzinfo=None)
-        async with db_pool.acquire() as conn:
-            await conn.execute("INSERT INTO reminders (user_phone, task, remind_at) VALUES ($1, $2, $3)", user_phone, task, remind_utc)
-        print(f"Saved: {task} at {remind_utc} UTC (local: {remind_local})")
+        with stage("db"):
+            async with db_pool.acquire() as conn:
+                reminder_id = await conn.fetchval("INSERT INTO reminders (user_phone, task, remind_at) VALUES ($1, $2, $3) RETURNING id", user_phone, task, remind_utc)
+                await kazi_reminders.notify_new_reminder(conn, reminder_id, remind_utc)
+        log.info("saved reminder %r at %s UTC (local: %s)", task, remind_utc, remind_local)
         return True
     return False
 
@@ -324,41 +258,33 @@ async def route_to_aifredo(phone: str, message: str) -> str | None:
     if not KAZI_AIFREDO_SECRET:
         return None
     try:
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
-                f"{AIFREDO_API_URL}/api/kazi/message",
-                json={"phone": phone, "message": message},
-                headers={"x-kazi-secret": KAZI_AIFREDO_SECRET},
-                timeout=30.0
-            )
-            if res.status_code == 200:
-                data = res.json()
-                if data.get("linked"):
-                    return data.get("reply")
+        url = f"{AIFREDO_API_URL}/api/kazi/message"
+        res = await kazi_http.client_for(url).post(
+            url,
+            json={"phone": phone, "message": message},
+            headers={"x-kazi-secret": KAZI_AIFREDO_SECRET},
+            timeout=30.0
+        )
+        if res.status_code == 200:
+            data = res.json()
+            if data.get("linked"):
+                return data.get("reply")
     except Exception as e:
-        print(f"[AiFredo] routing error: {e}")
+        log.error("AiFredo routing error: %s", e)
     return None
 
 async def get_response(user_message, user_phone):
-    user = await get_user(user_phone)
+    user = await touch_user(user_phone)
+    if user is None:
+        return LIMIT_REACHED_MSG
     user_tz = user.get("timezone")
     welcomed = user.get("welcomed", False)
     plan = user.get("plan", "free")
-    messages_today = user.get("messages_today", 0)
-    last_date = user.get("last_message_date")
-    
-    if last_date and last_date != date.today():
-        messages_today = 0
-    
-    if plan == "free" and messages_today >= FREE_DAILY_MESSAGES:
-        return LIMIT_REACHED_MSG
-    
-    new_count = await increment_message_count(user_phone)
+    new_count = user.get("messages_today", 1)
     
     msg_lower = user_message.lower().strip()
     
     if not welcomed:
-        await set_user_welcomed(user_phone)
         return WELCOME_MSG + "\n\n" + TIMEZONE_MSG
     
     tz_triggers = ["timezone", "time zone", "change tz", "my time is", "i'm in", "im in", "i am in", "i live in", "living in", "based in", "my time", "set it to", "cst", "est", "pst", "gmt", "cet"]
@@ -375,20 +301,31 @@ async def get_response(user_message, user_phone):
         if resolved:
             await set_user_tz(user_phone, resolved)
             local = get_local_time(resolved)
+            kazi_intents.record("timezone")
             return f"✅ Got it! Timezone set to {resolved}.\nYour local time: {local.strftime('%H:%M')}\n\nHow can I help you?"
         elif user_tz is None:
             return f"Hmm, I didn't recognize that. Try a city like 'London', 'New York', 'Tokyo', or 'CST', 'EST', 'CET'."
     
     if "upgrade" in msg_lower or "subscribe" in msg_lower:
+        kazi_intents.record("upgrade")
         return f"Upgrade to Kazi Pro for unlimited messages and reminders!\n\nOnly $5/month → {STRIPE_PAYMENT_LINK}"
     
     now_local = get_local_time(user_tz) if user_tz else datetime.now(timezone.utc)
     current_time = now_local.strftime("%Y-%m-%d %H:%M")
     tz_display = user_tz if user_tz else "UTC"
     
-    system = KAZI_SYSTEM.replace("{current_time}", current_time).replace("{timezone}", tz_display)
-    response = claude.messages.create(model="claude-sonnet-4-20250514", max_tokens=500, system=system, messages=[{"role": "user", "content": user_message}])
-    text = response.content[0].text
+    # Fast path: time, invite and simple reminders are answered without the LLM.
+    intent = kazi_intents.parse(user_message, now_local)
+    if intent is not None:
+        kazi_intents.record(intent["intent"])
+        if intent["intent"] == "reminder":
+            await save_reminder_at(user_phone, intent["task"], intent["at"])
+        text = kazi_intents.reply(intent, now_local, tz_display)
+    else:
+        kazi_intents.record("llm")
+        system = kazi_llm.cached_system(KAZI_SYSTEM, KAZI_CONTEXT.format(current_time=current_time, timezone=tz_display))
+        response = await kazi_llm.create_message(system=system, messages=[{"role": "user", "content": user_message}], max_tokens=500)
+        text = response.content[0].text
     
     if "REMINDER_JSON:" in text:
         try:
@@ -399,7 +336,7 @@ async def get_response(user_message, user_phone):
             await save_reminder(user_phone, data["task"], data["hour"], data["minute"], user_tz)
             text = text[:idx].strip()
         except Exception as e:
-            print(f"Parse error: {e}")
+            log.warning("REMINDER_JSON parse error: %s", e)
     
     if plan == "free":
         remaining = FREE_DAILY_MESSAGES - new_count
@@ -430,42 +367,106 @@ async def cookies():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "db": "connected" if db_pool else "none"}
+    return {
+        "status": "healthy",
+        "db": "connected" if db_pool else "none",
+        "llm": kazi_llm.stats(),
+        "connection_cache": kazi_gateway.connection_cache_stats(),
+        "inbound_queue": {**inbound_jobs.stats(), "mailboxes": inbound_mailboxes.stats()},
+        "voice_queue": {**voice_jobs.stats(), "mailboxes": voice_mailboxes.stats()},
+        "standalone_coalescing": standalone_coalescer.stats(),
+        "gateway_queues": kazi_gateway.routing_stats(),
+        "intents": kazi_intents.stats(),
+        "webhook_dedup": kazi_dedup.stats(),
+        "listen": kazi_notify.stats(),
+        "outbox": kazi_outbox.stats(),
+        "whatsapp_sender": whatsapp_sender.stats(),
+        "logging": kazi_log.stats(),
+    }
 
 @app.get("/stats")
-async def stats():
+async def stats(days: int = 7):
     if db_pool:
-        async with db_pool.acquire() as conn:
-            total = await conn.fetchval("SELECT COUNT(*) FROM users")
-            pro = await conn.fetchval("SELECT COUNT(*) FROM users WHERE plan = 'pro'")
-            today = await conn.fetchval("SELECT COUNT(*) FROM users WHERE last_message_date = CURRENT_DATE")
-            reminders = await conn.fetchval("SELECT COUNT(*) FROM reminders WHERE sent = FALSE")
-            return {
-                "total_users": total,
-                "pro_users": pro,
-                "active_today": today,
-                "pending_reminders": reminders
-            }
+        summary = await kazi_stats.summary(db_pool)
+        return {**summary, "history": await kazi_stats.history(db_pool, max(1, min(days, 366)))}
     return {"error": "no database"}
 
-@app.post("/webhook")
-async def webhook(From: str = Form(...), Body: str = Form(default=""), NumMedia: str = Form(default="0"), MediaUrl0: str = Form(default=None), MediaContentType0: str = Form(default=None)):
+def runtime_metrics():
+    """Point-in-time gauges for /metrics: pool use, queue depths, LLM slots, caches."""
+    queues = {("inbound",): inbound_jobs.stats(), ("voice",): voice_jobs.stats()}
+    for product, q in kazi_gateway.routing_stats()["products"].items():
+        queues[(f"gateway:{product}",)] = q
+    cache = kazi_gateway.connection_cache_stats()
+    llm = kazi_llm.stats()
+    sender = whatsapp_sender.stats()
+    families = [
+        ("kazi_queue_depth", "gauge", "Jobs waiting in each work queue.", {k: q["depth"] for k, q in queues.items()}, ("queue",)),
+        ("kazi_queue_busy_workers", "gauge", "Workers running a job.", {k: q["busy_workers"] for k, q in queues.items()}, ("queue",)),
+        ("kazi_queue_rejected_total", "counter", "Jobs refused because a queue was full.", {k: q["rejected"] for k, q in queues.items()}, ("queue",)),
+        ("kazi_llm_requests", "gauge", "Claude calls in flight / waiting for a slot.", {("in_flight",): llm["in_flight"], ("waiting",): llm["waiting"]}, ("state",)),
+        ("kazi_connection_cache_lookups_total", "counter", "Gateway connection lookups by result.",
+         {(k,): cache[k] for k in ("hits", "negative_hits", "misses")}, ("result",)),
+        ("kazi_coalesced_calls_saved_total", "counter", "Upstream calls avoided by message coalescing.",
+         {("standalone",): standalone_coalescer.stats()["calls_saved"],
+          ("gateway",): kazi_gateway.routing_stats()["coalescing"]["calls_saved"]}, ("coalescer",)),
+        ("kazi_whatsapp_outbound", "gauge", "Outbound WhatsApp messages queued for the rate limiter / awaiting delivery.",
+         {("queued",): sender["queued"], ("pending",): sender["pending"]}, ("state",)),
+    ]
+    circuit = kazi_gateway.breaker_stats()
+    states = {kazi_gateway.BREAKER_CLOSED: 0, kazi_gateway.BREAKER_HALF_OPEN: 1, kazi_gateway.BREAKER_OPEN: 2}
+    families += [
+        ("kazi_gateway_breaker_state", "gauge", "Product circuit breaker: 0 closed, 1 half-open, 2 open.",
+         {(name,): states[b["state"]] for name, b in circuit["breakers"].items()}, ("endpoint",)),
+        ("kazi_gateway_breaker_rejected_total", "counter", "Product calls failed fast by an open breaker.",
+         {(name,): b["rejected"] for name, b in circuit["breakers"].items()}, ("endpoint",)),
+        ("kazi_gateway_breaker_opened_total", "counter", "Times each product breaker has opened.",
+         {(name,): b["opened"] for name, b in circuit["breakers"].items()}, ("endpoint",)),
+        ("kazi_gateway_retry_budget_tokens", "gauge", "Retries currently available to product calls.",
+         {(): circuit["retry_budget_tokens"]}, ()),
+    ]
+    if db_pool:
+        size, idle = db_pool.get_size(), db_pool.get_idle_size()
+        families.append((
+            "kazi_db_pool_connections", "gauge", "asyncpg pool connections by state.",
+            {("in_use",): size - idle, ("idle",): idle, ("max",): db_pool.get_max_size()}, ("state",),
+        ))
+    return families
+
+kazi_metrics.register_collector(runtime_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=kazi_metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def transcribe_inbound(From, MediaUrl0, MediaContentType0):
+    """Transcribe a voice note on the voice workers, then handle the text in the sender's inbound mailbox."""
+    PATH.set("inbound")
+    log.info("processing audio: %s", MediaUrl0)
     try:
-        print(f"Webhook received: From={From}, Body={Body}, NumMedia={NumMedia}")
-        if int(NumMedia) > 0 and MediaContentType0 and "audio" in MediaContentType0:
-            print(f"Processing audio: {MediaUrl0}")
-            user_message = await transcribe_audio(MediaUrl0)
-        else:
-            user_message = Body
+        user_message = await kazi_voice.transcribe_audio(MediaUrl0, MediaContentType0)
+    except Exception as e:
+        log.error("transcription error: %s", e, exc_info=True)
+        await send_whatsapp(From, "Sorry, something went wrong.")
+        return
+    if not inbound_mailboxes.post(From, handle_inbound, From, user_message):
+        log.warning("inbound queue full — dropping transcribed voice note from %s", From)
+        await send_whatsapp(From, BUSY_MSG)
+
+async def handle_inbound(From, user_message):
+    """Process one inbound WhatsApp message off the request path; replies go out via send_whatsapp."""
+    PATH.set("inbound")
+    try:
+        await kazi_stats.mark_active(db_pool, From)
         if not user_message.strip():
-            return Response(content="", media_type="text/xml")
+            return
+        kazi_stats.bump("messages")
 
         stripped = user_message.strip()
 
         # 1. Gateway linking: "CONNECT-<token>" — exchange with Always On
         token = kazi_gateway.extract_connect_token(stripped)
         if token:
-            print(f"[GATEWAY] CONNECT token received from {From}")
+            log.info("CONNECT token received from %s", From)
             reply = await kazi_gateway.handle_connect_message(db_pool, From, token)
             # If link succeeded, install default schedules for this connection
             if reply == kazi_gateway.MSG_LINKED:
@@ -474,60 +475,96 @@ async def webhook(From: str = Form(...), Body: str = Form(default=""), NumMedia:
                     await kazi_gateway.install_default_schedules(
                         db_pool, From, conn["client_id"]
                     )
-                    print(f"[GATEWAY] Default schedules installed for {From}")
+                    log.info("default schedules installed for %s", From)
             await send_whatsapp(From, reply)
-            return Response(content="<Response></Response>", media_type="text/xml")
+            return
 
         # 2. Gateway routing: if sender is linked to a product, route to product API.
         #    No LLM call in Kazi for routed messages.
         connection = await kazi_gateway.get_connection(db_pool, From)
         if connection:
-            print(f"[GATEWAY] Routing {From} to {connection.get('product')} client {connection.get('client_id')}")
-            # Ack immediately (satisfies Twilio 5s timeout)
-            await send_whatsapp(From, kazi_gateway.ACK_MESSAGE)
-            # Process in background; reply arrives as a second WhatsApp message
-            asyncio.create_task(
-                kazi_gateway.process_and_reply(
-                    db_pool, send_whatsapp, From, user_message, connection
-                )
-            )
-            return Response(content="<Response></Response>", media_type="text/xml")
+            PATH.set("gateway")
+            MESSAGES_TOTAL.inc("gateway")
+            # Process under the product's concurrency limit; reply arrives as a second WhatsApp message
+            await kazi_gateway.route_message(db_pool, send_whatsapp, From, user_message, connection)
+            return
 
-        print(f"[GATEWAY] No connection found for {From} — falling through to standalone Kazi")
+        log.debug("no connection found for %s — falling through to standalone Kazi", From)
 
         # 3. Legacy AiFredo bridge (aifredo.chat) — kept for existing users.
         stripped_lower = stripped.lower()
         if stripped_lower.startswith("connect "):
             code = stripped[8:].strip()
             try:
-                async with httpx.AsyncClient(timeout=10) as client:
-                    r = await client.post(
-                        f"{AIFREDO_API_URL}/api/kazi/activate",
-                        json={"code": code, "phone": From},
-                        headers={"x-kazi-secret": KAZI_AIFREDO_SECRET},
-                    )
-                    data = r.json()
+                url = f"{AIFREDO_API_URL}/api/kazi/activate"
+                r = await kazi_http.client_for(url).post(
+                    url,
+                    json={"code": code, "phone": From},
+                    headers={"x-kazi-secret": KAZI_AIFREDO_SECRET},
+                    timeout=10,
+                )
+                data = r.json()
                 if data.get("ok"):
                     agent = data.get("agent_name", "your agent")
                     await send_whatsapp(From, f"✅ Connected! {agent} is now available here on WhatsApp. Just send a message anytime.")
                 else:
                     await send_whatsapp(From, "❌ That code didn't work — it may have expired. Go to AiFredo and generate a new one.")
             except Exception as e:
-                print(f"[AiFredo activate] error: {e}")
+                log.error("AiFredo activate error: %s", e)
                 await send_whatsapp(From, "Something went wrong connecting. Please try again.")
-            return Response(content="<Response></Response>", media_type="text/xml")
+            return
+
+        if standalone_coalescer.enabled:
+            standalone_coalescer.add(From, user_message)
+            return
+        await answer_standalone(From, user_message)
+    except Exception as e:
+        log.error("inbound error: %s", e, exc_info=True)
+        await send_whatsapp(From, "Sorry, something went wrong.")
 
+async def answer_standalone(From, user_message):
+    PATH.set("standalone")
+    try:
         aifredo_reply = await route_to_aifredo(From, user_message)
         if aifredo_reply:
+            PATH.set("aifredo")
+            MESSAGES_TOTAL.inc("aifredo")
             await send_whatsapp(From, aifredo_reply)
         else:
             # 4. Standalone Kazi session (user not linked to any product) — Kazi's own Claude
+            MESSAGES_TOTAL.inc("standalone")
             response = await get_response(user_message, From)
             await send_whatsapp(From, response)
     except Exception as e:
-        print(f"Error: {e}")
-        print(traceback.format_exc())
+        log.error("inbound error: %s", e, exc_info=True)
         await send_whatsapp(From, "Sorry, something went wrong.")
+
+async def flush_standalone(From, messages, context):
+    # Runs the merged burst in the sender's mailbox so it stays ordered with their other messages.
+    if not inbound_mailboxes.post(From, answer_standalone, From, "\n".join(messages)):
+        await send_whatsapp(From, BUSY_MSG)
+
+standalone_coalescer = kazi_jobs.Coalescer("standalone", COALESCE_STANDALONE_MS, flush_standalone)
+
+@app.post("/webhook")
+async def webhook(From: str = Form(...), Body: str = Form(default=""), NumMedia: str = Form(default="0"), MediaUrl0: str = Form(default=None), MediaContentType0: str = Form(default=None), MessageSid: str = Form(default=None)):
+    kazi_log.new_request_id(MessageSid)
+    # Hottest line in the service: sampled, and never the message text itself.
+    log.info("webhook received", extra={"fields": {"from": From, "chars": len(Body), "num_media": NumMedia},
+                                        **kazi_log.sample(0.05)})
+    # Twilio retries a slow webhook with the same MessageSid; the first delivery is already being handled.
+    if MessageSid and await kazi_dedup.seen_before(db_pool, MessageSid):
+        log.info("duplicate webhook %s from %s ignored", MessageSid, From)
+        return Response(content="<Response></Response>", media_type="text/xml")
+    # Answer Twilio immediately; the real reply is sent by a worker. Voice notes are
+    # transcribed first, on their own queue; a text sent meanwhile may be answered first.
+    if NumMedia.isdigit() and int(NumMedia) > 0 and MediaContentType0 and "audio" in MediaContentType0:
+        queued = voice_mailboxes.post(From, transcribe_inbound, From, MediaUrl0, MediaContentType0)
+    else:
+        queued = inbound_mailboxes.post(From, handle_inbound, From, Body)
+    if not queued:
+        log.warning("inbound queue full — rejecting message from %s", From)
+        return Response(content=f"<Response><Message>{BUSY_MSG}</Message></Response>", media_type="text/xml")
     return Response(content="<Response></Response>", media_type="text/xml")
 
 @app.post("/stripe-webhook")
@@ -539,20 +576,39 @@ async def stripe_webhook(request: Request):
             session = event["data"]["object"]
             customer_email = session.get("customer_details", {}).get("email", "")
             customer_phone = session.get("customer_details", {}).get("phone", "")
-            print(f"Payment received: {customer_email} / {customer_phone}")
+            log.info("payment received: %s / %s", customer_email, customer_phone)
             
             if customer_phone and db_pool:
-                digits = ''.join(filter(str.isdigit, customer_phone))
+                digits = phone_digits(customer_phone)
                 async with db_pool.acquire() as conn:
-                    await conn.execute(
-                        "UPDATE users SET plan = 'pro' WHERE phone LIKE '%' || $1 || '%'", 
-                        digits[-10:]
-                    )
-                    print(f"Upgraded user with phone: {digits[-10:]}")
+                    async with conn.transaction():
+                        # Stripe retries deliveries; an event id we've seen is a no-op.
+                        first_time = await conn.fetchval(
+                            "INSERT INTO stripe_events (id, type) VALUES ($1, $2) ON CONFLICT DO NOTHING RETURNING id",
+                            event["id"], event["type"]
+                        )
+                        if not first_time:
+                            log.info("stripe event %s already processed", event["id"])
+                            return JSONResponse({"status": "ok", "duplicate": True})
+                        # Rows not yet reached by backfill_phone_digits match on the raw phone.
+                        result = await conn.execute("""
+                            UPDATE users SET plan = 'pro', phone_digits = $1
+                            WHERE phone_digits = $1
+                               OR (phone_digits IS NULL AND regexp_replace(phone, '[^0-9]', '', 'g') = $1)
+                        """, digits)
+                        if result == "UPDATE 0":
+                            # A retry wouldn't match either: keep the event for a manual look and answer 2xx.
+                            await conn.execute(
+                                "UPDATE stripe_events SET unmatched_phone = $2 WHERE id = $1", event["id"], digits
+                            )
+                    if result == "UPDATE 0":
+                        log.error("payment %s matched no user with phone %s", event["id"], digits)
+                        return JSONResponse({"status": "ok", "matched": False})
+                    log.info("upgraded user with phone: %s (%s)", digits, result)
                     
         return JSONResponse({"status": "ok"})
     except Exception as e:
-        print(f"Stripe webhook error: {e}")
+        log.error("stripe webhook error: %s", e)
         return JSONResponse({"error": str(e)}, status_code=400)
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+-- Baseline schema: everything init_db / init_gateway_schema used to create on boot.
+-- IF NOT EXISTS throughout so it is a no-op on databases that already have it.
+
+CREATE TABLE IF NOT EXISTS reminders (
+    id         SERIAL PRIMARY KEY,
+    user_phone VARCHAR(50) NOT NULL,
+    task       TEXT NOT NULL,
+    remind_at  TIMESTAMP NOT NULL,
+    sent       BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    phone              VARCHAR(50) PRIMARY KEY,
+    timezone           VARCHAR(50) DEFAULT NULL,
+    welcomed           BOOLEAN DEFAULT FALSE,
+    plan               VARCHAR(20) DEFAULT 'free',
+    messages_today     INT DEFAULT 0,
+    last_message_date  DATE DEFAULT CURRENT_DATE,
+    stripe_customer_id VARCHAR(100) DEFAULT NULL
+);
+
+-- Columns added to users after the first deploy.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS welcomed BOOLEAN DEFAULT FALSE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS plan VARCHAR(20) DEFAULT 'free';
+ALTER TABLE users ADD COLUMN IF NOT EXISTS messages_today INT DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_message_date DATE DEFAULT CURRENT_DATE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS stripe_customer_id VARCHAR(100) DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS kazi_connections (
+    id                   TEXT PRIMARY KEY,
+    whatsapp_number      TEXT UNIQUE NOT NULL,
+    client_id            TEXT NOT NULL,
+    product              TEXT NOT NULL,
+    product_api_endpoint TEXT NOT NULL,
+    product_api_key      TEXT NOT NULL,
+    linked_at            TIMESTAMPTZ DEFAULT NOW(),
+    last_active          TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS kazi_scheduled (
+    id                   TEXT PRIMARY KEY,
+    whatsapp_number      TEXT NOT NULL,
+    product              TEXT NOT NULL,
+    client_id            TEXT NOT NULL,
+    schedule             TEXT NOT NULL,   -- 'HH:MM'
+    days_of_week         TEXT DEFAULT '1,2,3,4,5', -- ISO weekday, 1=Mon..7=Sun
+    message_type         TEXT NOT NULL,   -- e.g. 'daily_digest', 'weekly_report'
+    active               BOOLEAN DEFAULT TRUE,
+    last_sent            TIMESTAMPTZ
+);
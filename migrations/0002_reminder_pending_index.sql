@@ -0,0 +1,2 @@
+-- Index for the batched reminder dispatcher's scan of pending reminders.
+CREATE INDEX IF NOT EXISTS reminders_pending_remind_at_idx ON reminders (remind_at) WHERE sent = FALSE;
@@ -0,0 +1,4 @@
+-- Per-connection timezone and precomputed next_run_at for scheduled pushes.
+ALTER TABLE kazi_connections ADD COLUMN IF NOT EXISTS timezone TEXT DEFAULT 'UTC';
+ALTER TABLE kazi_scheduled ADD COLUMN IF NOT EXISTS next_run_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS kazi_scheduled_next_run_at_idx ON kazi_scheduled (next_run_at) WHERE active = TRUE;
@@ -0,0 +1,4 @@
+-- kazi:no-transaction
+-- Lookups by number (scheduler join, install_default_schedules, re-anchoring).
+-- Built CONCURRENTLY so it doesn't block writes to kazi_scheduled.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kazi_scheduled_whatsapp_number_idx ON kazi_scheduled (whatsapp_number, message_type);
@@ -0,0 +1,8 @@
+-- Incrementally maintained daily rollup behind /stats history (UTC days).
+CREATE TABLE IF NOT EXISTS kazi_daily_stats (
+    day            DATE PRIMARY KEY,
+    active_users   INT NOT NULL DEFAULT 0,
+    messages       INT NOT NULL DEFAULT 0,
+    reminders_sent INT NOT NULL DEFAULT 0,
+    gateway_calls  INT NOT NULL DEFAULT 0
+);
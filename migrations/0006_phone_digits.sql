@@ -0,0 +1,12 @@
+-- Normalized phone (digits only, E.164 without '+') for exact lookups, e.g. Stripe upgrades.
+-- Existing rows are filled in by kazi_phone.backfill_phone_digits in batches.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS phone_digits TEXT;
+
+-- Stripe event ids already processed, so webhook retries are no-ops.
+-- unmatched_phone is set when a payment matched no user and needs a manual look.
+CREATE TABLE IF NOT EXISTS stripe_events (
+    id              TEXT PRIMARY KEY,
+    type            TEXT NOT NULL,
+    processed_at    TIMESTAMPTZ DEFAULT NOW(),
+    unmatched_phone TEXT
+);
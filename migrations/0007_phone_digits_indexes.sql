@@ -0,0 +1,2 @@
+-- kazi:no-transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_phone_digits_idx ON users (phone_digits);
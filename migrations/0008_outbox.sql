@@ -0,0 +1,19 @@
+-- Durable outbox for every outgoing WhatsApp message; drained by kazi_outbox delivery workers.
+CREATE TABLE IF NOT EXISTS kazi_outbox (
+    id              BIGSERIAL PRIMARY KEY,
+    to_number       TEXT NOT NULL,
+    body            TEXT NOT NULL,
+    source          TEXT NOT NULL DEFAULT 'system',
+    status          TEXT NOT NULL DEFAULT 'pending',  -- pending | sent | dead
+    due_at          TIMESTAMPTZ NOT NULL DEFAULT NOW(),  -- when the message became due (lag metrics)
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    attempts        INT NOT NULL DEFAULT 0,
+    claimed_at      TIMESTAMPTZ,
+    sent_at         TIMESTAMPTZ,
+    twilio_sid      TEXT,
+    last_error      TEXT,
+    request_id      TEXT,  -- kazi_log correlation id of whatever produced the message
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS kazi_outbox_pending_idx ON kazi_outbox (next_attempt_at) WHERE status = 'pending';
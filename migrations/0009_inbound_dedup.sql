@@ -0,0 +1,8 @@
+-- Twilio MessageSids already accepted by /webhook, so webhook retries are no-ops.
+-- Rows only need to outlive Twilio's retry window; kazi_dedup prunes them after DEDUP_TTL_SECONDS.
+CREATE TABLE IF NOT EXISTS kazi_inbound_messages (
+    message_sid TEXT PRIMARY KEY,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS kazi_inbound_messages_received_at_idx ON kazi_inbound_messages (received_at);
@@ -0,0 +1,3 @@
+-- Lease on a scheduled job while its product call is in flight. next_run_at only
+-- advances once the message is queued, so a failed or crashed run is retried.
+ALTER TABLE kazi_scheduled ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMPTZ;
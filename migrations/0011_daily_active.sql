@@ -0,0 +1,7 @@
+-- Senders seen per UTC day, so active_users counts each sender once a day across
+-- replicas and every path (standalone, gateway, AiFredo). kazi_stats prunes old days.
+CREATE TABLE IF NOT EXISTS kazi_daily_active (
+    day   DATE NOT NULL,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (day, phone)
+);
@@ -0,0 +1,3 @@
+-- kazi:no-transaction
+-- claim_batch only takes a number's oldest pending message; this makes that check an index probe.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kazi_outbox_pending_number_idx ON kazi_outbox (to_number, id) WHERE status = 'pending';
@@ -0,0 +1,101 @@
+"""
+Handshake savings of kazi_http's shared clients, measured against a local TLS
+stub that counts accepted connections: one pooled client vs a new
+`httpx.AsyncClient` per call.
+
+Run with `pytest -s tests/test_http_pooling.py` to see the timings.
+"""
+
+import ssl
+import time
+import shutil
+import asyncio
+import subprocess
+
+import httpx
+import pytest
+
+import kazi_http
+
+MESSAGES = 50
+
+
+def _self_signed_cert(tmp_path):
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1,DNS:localhost",
+         "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+async def _start_stub(cert, key):
+    """Keep-alive HTTP/1.1 stub answering every request with `{}`; counts TLS connections."""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    accepted = []
+
+    async def handle(reader, writer):
+        accepted.append(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=context)
+    return server, accepted
+
+
+async def _pooled(url):
+    for i in range(MESSAGES):
+        resp = await kazi_http.client_for(url).post(url, json={"n": i})
+        assert resp.status_code == 200
+
+
+async def _fresh(url):
+    for i in range(MESSAGES):
+        async with httpx.AsyncClient() as client:
+            resp = await client.post(url, json={"n": i})
+        assert resp.status_code == 200
+
+
+@pytest.mark.skipif(shutil.which("openssl") is None, reason="openssl CLI needed for the stub certificate")
+def test_shared_client_reuses_one_tls_connection(tmp_path, monkeypatch):
+    cert, key = _self_signed_cert(tmp_path)
+    monkeypatch.setenv("SSL_CERT_FILE", str(cert))  # httpx trusts it via trust_env
+
+    async def run():
+        results = {}
+        for name, send in (("pooled", _pooled), ("fresh", _fresh)):
+            server, accepted = await _start_stub(cert, key)
+            url = f"https://127.0.0.1:{server.sockets[0].getsockname()[1]}/api/kazi/message"
+            started = time.perf_counter()
+            await send(url)
+            results[name] = (len(accepted), time.perf_counter() - started)
+            await kazi_http.close_clients()
+            server.close()
+            for writer in accepted:
+                writer.close()
+            await server.wait_closed()
+        return results
+
+    results = asyncio.run(run())
+    for name, (connections, elapsed) in results.items():
+        print(f"{name:>6}: {MESSAGES} POSTs, {connections} TLS connections, "
+              f"{elapsed / MESSAGES * 1000:.2f} ms/call")
+    assert results["pooled"][0] == 1
+    assert results["fresh"][0] == MESSAGES
+    assert results["pooled"][1] < results["fresh"][1]
@@ -0,0 +1,77 @@
+"""kazi_intents fast-path grammar: what it answers, what it leaves to the LLM, and how fast."""
+
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from kazi_intents import parse, reply
+
+CHICAGO = ZoneInfo("America/Chicago")
+# 2025-03-09 is the US spring-forward day (02:00 CST -> 03:00 CDT).
+NOW = datetime(2025, 3, 9, 14, 5, tzinfo=CHICAGO)
+
+
+def _at(day, hour, minute):
+    return datetime(2025, 3, day, hour, minute, tzinfo=CHICAGO)
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("what time is it?", "time"),
+    ("Time", "time"),
+    ("invite", "invite"),
+    ("how do I share kazi", "invite"),
+])
+def test_simple_intents(text, intent):
+    assert parse(text, NOW) == {"intent": intent}
+
+
+@pytest.mark.parametrize("text, task, at, relative", [
+    ("remind me at 5pm to call mom", "call mom", _at(9, 17, 0), False),
+    ("Remind me to call mom at 5 pm", "call mom", _at(9, 17, 0), False),
+    ("remind me in 20 minutes to check the oven", "check the oven", _at(9, 14, 25), True),
+    ("remind me to stretch in an hour", "stretch", _at(9, 15, 5), True),
+    ("please remind me tomorrow at 9am to pay rent", "pay rent", _at(10, 9, 0), False),
+    ("remind me at 17:30 to leave", "leave", _at(9, 17, 30), False),
+    ("remind me at noon to eat", "eat", _at(10, 12, 0), False),  # noon has passed: tomorrow
+    ("remind me to drink water in half an hour", "drink water", _at(9, 14, 35), True),
+])
+def test_reminders(text, task, at, relative):
+    intent = parse(text, NOW)
+    assert intent == {"intent": "reminder", "task": task, "at": at, "relative": relative}
+    assert reply(intent, NOW, "America/Chicago").startswith(f"✅ Reminder set: {task} ")
+
+
+@pytest.mark.parametrize("text", [
+    "remind me at 5 to call mom",  # am or pm?
+    "remind me every day at 9am to run",
+    "remind me this evening to call",
+    "remind me on friday at 3pm to submit",
+    "what time is it in tokyo",
+    "tell me a joke",
+    "remind me at 5pm",  # no task
+    "remind me today at 9am to run",  # already past
+])
+def test_unsure_messages_fall_back_to_the_llm(text):
+    assert parse(text, NOW) is None
+
+
+def test_relative_time_across_spring_forward():
+    before = datetime(2025, 3, 9, 1, 30, tzinfo=CHICAGO)
+    intent = parse("remind me in an hour to sleep", before)
+    assert intent["at"].astimezone(timezone.utc) - before.astimezone(timezone.utc) == timedelta(hours=1)
+    assert (intent["at"].hour, intent["at"].minute) == (3, 30)
+
+
+def test_parse_is_cheap():
+    samples = [
+        "what time is it?", "remind me at 5pm to call mom", "remind me in 20 minutes to check the oven",
+        "remind me every day at 9am to run", "tell me a joke",
+    ]
+    n = 5000
+    started = time.perf_counter()
+    for i in range(n):
+        parse(samples[i % len(samples)], NOW)
+    per_parse_us = (time.perf_counter() - started) / n * 1e6
+    assert per_parse_us < 200, f"{per_parse_us:.1f} us/parse"
@@ -0,0 +1,96 @@
+"""Per-sender ordering under load, backlog limits, context propagation and coalescer shutdown in kazi_jobs."""
+
+import random
+import asyncio
+
+import kazi_log
+from kazi_jobs import Coalescer, JobQueue, Mailboxes
+
+
+def test_mailboxes_keep_each_senders_order_under_load():
+    senders, per_sender, workers = 500, 10, 32
+
+    async def run():
+        queue = JobQueue("stress", workers, senders * per_sender)
+        boxes = Mailboxes(queue, max_pending=per_sender)
+        seen: dict = {}
+        in_flight: set = set()
+
+        async def job(sender, seq):
+            assert sender not in in_flight, f"sender {sender} ran concurrently"
+            in_flight.add(sender)
+            await asyncio.sleep(random.random() * 0.002)
+            in_flight.discard(sender)
+            seen.setdefault(sender, []).append(seq)
+
+        queue.start()
+        # Interleave senders the way a burst of webhooks would arrive.
+        for seq in range(per_sender):
+            for sender in range(senders):
+                assert boxes.post(sender, job, sender, seq)
+        await queue.drain(timeout=60)
+        return seen, queue.stats(), boxes.stats()
+
+    seen, queue_stats, box_stats = asyncio.run(run())
+    assert len(seen) == senders
+    assert all(seqs == list(range(per_sender)) for seqs in seen.values()), "out of order"
+    assert queue_stats["failed"] == 0
+    assert box_stats["active"] == 0 and box_stats["pending"] == 0  # every mailbox evicted
+
+
+def test_mailbox_rejects_past_its_backlog_limit():
+    async def run():
+        queue = JobQueue("limit", 1, 10)
+        boxes = Mailboxes(queue, max_pending=2)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        queue.start()
+        accepted = [boxes.post("+1555", job) for _ in range(4)]  # 1 running + 2 waiting + 1 too many
+        release.set()
+        await queue.drain(timeout=5)
+        return accepted, boxes.stats()
+
+    accepted, stats = asyncio.run(run())
+    assert accepted == [True, True, True, False]
+    assert stats["rejected"] == 1
+
+
+def test_jobs_run_in_the_submitting_context():
+    async def run():
+        queue = JobQueue("ctx", 2, 10)
+        boxes = Mailboxes(queue)
+        seen = []
+
+        async def job():
+            seen.append(kazi_log.REQUEST_ID.get())
+
+        queue.start()
+        for rid in ("SM1", "SM2", "SM3"):
+            kazi_log.new_request_id(rid)
+            boxes.post("+1555", job)
+        await queue.drain(timeout=5)
+        return seen
+
+    assert asyncio.run(run()) == ["SM1", "SM2", "SM3"]
+
+
+def test_coalescer_stops_opening_bursts_after_flush_all():
+    async def run():
+        flushed = []
+
+        async def flush(key, texts, context):
+            flushed.append((key, texts))
+
+        coalescer = Coalescer("shutdown", 10_000, flush)
+        coalescer.add("+1555", "hi")
+        coalescer.add("+1555", "there")
+        await coalescer.flush_all()
+        return flushed, coalescer.enabled, coalescer.stats()
+
+    flushed, enabled, stats = asyncio.run(run())
+    assert flushed == [("+1555", ["hi", "there"])]
+    assert not enabled
+    assert stats["open_bursts"] == 0
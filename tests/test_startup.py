@@ -0,0 +1,47 @@
+"""
+Startup regression check: `import main` must not pull in the LLM SDKs and must
+stay inside an import-time budget (KAZI_IMPORT_BUDGET_MS, default 1500).
+Runs `python -X importtime` in a fresh interpreter against the real dependencies.
+"""
+
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_MS = float(os.getenv("KAZI_IMPORT_BUDGET_MS", "1500"))
+DEFERRED = ("anthropic", "openai")
+
+for _dependency in ("fastapi", "asyncpg", "httpx", "multipart"):
+    pytest.importorskip(_dependency)
+
+
+def _import_main():
+    code = f"import json, sys, main; print(json.dumps([m for m in {DEFERRED!r} if m in sys.modules]))"
+    env = {**os.environ, "DATABASE_URL": "", "PYTHONDONTWRITEBYTECODE": ""}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split(":", 1)[1].split("|")
+            if cumulative.strip().isdigit():
+                cumulative_us[name.strip()] = int(cumulative)
+    return json.loads(result.stdout.strip().splitlines()[-1]), cumulative_us
+
+
+def test_import_main_defers_sdks_and_stays_in_budget():
+    _import_main()  # warm the bytecode cache so the budget measures imports, not compilation
+    loaded, cumulative_us = _import_main()
+    assert loaded == [], f"imported at startup: {loaded}"
+    main_ms = cumulative_us["main"] / 1000
+    slowest = sorted(cumulative_us.items(), key=lambda item: -item[1])[1:6]
+    print(f"import main: {main_ms:.0f} ms; slowest: " + ", ".join(f"{n} {us / 1000:.0f} ms" for n, us in slowest))
+    assert main_ms < IMPORT_BUDGET_MS, f"import main took {main_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
@@ -0,0 +1,108 @@
+"""kazi_twilio.Sender against a stub Twilio: throttling, error classification and attempt limits."""
+
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import kazi_twilio
+from kazi_twilio import DeliveryFailed, Sender
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(kazi_twilio, "TWILIO_BACKOFF_SECONDS", 0.01)
+
+
+async def _send_all(handler, sends, **sender_kwargs):
+    """Run `sends` (a list of send() kwargs) through a Sender; returns (results, stats)."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    sender = Sender("AC_stub", "token", "whatsapp:+15734125273", client=client, **sender_kwargs)
+    sender.start()
+    try:
+        results = await asyncio.gather(*(sender.send(**kw) for kw in sends), return_exceptions=True)
+    finally:
+        await sender.close()
+        await client.aclose()
+    return results, sender.stats()
+
+
+def _twilio_error(status, code):
+    return httpx.Response(status, json={"code": code, "message": "stub error"})
+
+
+def test_rides_out_429s_and_503s():
+    messages, stub_rate = 60, 10.0
+    hits = []
+
+    def handler(request):
+        # Allows `stub_rate` requests per rolling second, 429s above that,
+        # and fails every 13th request with a 503.
+        now = time.monotonic()
+        hits.append(now)
+        if len(hits) % 13 == 0:
+            return httpx.Response(503)
+        if sum(1 for t in hits if now - t < 1.0) > stub_rate:
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(201, json={"sid": f"SM{len(hits)}"})
+
+    # Paced slightly above what the stub allows, so the sender must be throttled.
+    sends = [{"to": f"whatsapp:+1555000{i:04d}", "body": "hi"} for i in range(messages)]
+    results, stats = asyncio.run(_send_all(handler, sends, rate=12, burst=12))
+
+    assert not [r for r in results if isinstance(r, Exception)]
+    assert len(set(results)) == messages
+    assert stats["sent"] == messages and stats["failed"] == 0
+    assert stats["throttled"] > 0
+    assert len(hits) > messages
+
+
+def test_permanent_error_fails_after_one_post():
+    hits = []
+
+    def handler(request):
+        hits.append(request)
+        return _twilio_error(400, 21610)
+
+    results, stats = asyncio.run(_send_all(handler, [{"to": "whatsapp:+15550001", "body": "hi"}]))
+
+    assert isinstance(results[0], DeliveryFailed) and results[0].permanent
+    assert results[0].code == 21610
+    assert len(hits) == 1 and stats["retried"] == 0
+
+
+@pytest.mark.parametrize("first", [
+    httpx.Response(401, json={"code": 20003, "message": "Authenticate"}),
+    _twilio_error(400, 21606),  # not a message-level rejection
+])
+def test_other_4xx_are_retried(first):
+    hits = []
+
+    def handler(request):
+        hits.append(request)
+        return first if len(hits) == 1 else httpx.Response(201, json={"sid": "SM1"})
+
+    results, stats = asyncio.run(_send_all(handler, [{"to": "whatsapp:+15550001", "body": "hi"}]))
+
+    assert results == ["SM1"]
+    assert len(hits) == 2
+    assert stats["auth_errors"] == (first.status_code == 401)
+
+
+def test_max_attempts_and_deadline():
+    hits = []
+
+    def handler(request):
+        hits.append(request)
+        return httpx.Response(429)
+
+    sends = [
+        {"to": "whatsapp:+15550001", "body": "once", "max_attempts": 1},
+        {"to": "whatsapp:+15550002", "body": "late", "deadline": time.monotonic() - 1},
+    ]
+    results, stats = asyncio.run(_send_all(handler, sends))
+
+    assert [r.status for r in results] == [429, "expired"]
+    assert len(hits) == 1  # the expired message never reached Twilio
+    assert stats["expired"] == 1 and stats["retried"] == 0
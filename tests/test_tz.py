@@ -0,0 +1,61 @@
+"""resolve_tz correctness, and the trie against the linear substring scan it replaced."""
+
+import timeit
+
+import pytest
+
+from kazi_tz import TZ_MAP, get_zone, resolve_tz
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Stockholm", "Europe/Stockholm"),
+    ("i live in stockholm sweden", "Europe/Stockholm"),
+    ("I'm in New York", "America/New_York"),
+    ("based in kuala lumpur", "Asia/Kuala_Lumpur"),
+    ("south korea", "Asia/Seoul"),               # longest phrase wins over "korea"
+    ("i'm in atlanta", "America/New_York"),      # whole words only: no "la" inside "atlanta"
+    ("remind me tomorrow to water the plants", None),  # ...or inside "plants"
+    ("remind me at 5 pm est", "America/New_York"),
+    ("CET", "Europe/Paris"),
+    ("utc", "UTC"),
+    ("what is the best restaurant near me", None),
+    ("how many grams of sugar are in a teaspoon", None),
+    ("", None),
+])
+def test_resolve_tz(text, expected):
+    assert resolve_tz(text) == expected
+
+
+def test_get_zone_is_memoized_and_rejects_unknown_names():
+    assert get_zone("Europe/Berlin") is get_zone("Europe/Berlin")
+    assert get_zone("Not/AZone") is None
+
+
+def _linear_resolve(text):
+    """The lookup resolve_tz replaced: first TZ_MAP key found anywhere in the text."""
+    text = text.lower().strip()
+    if text in TZ_MAP:
+        return TZ_MAP[text]
+    for key, tz in TZ_MAP.items():
+        if key in text or text in key:
+            return tz
+    return None
+
+
+def test_trie_is_faster_than_linear_scan_on_ordinary_messages():
+    # Most messages name no place at all, which is where the linear scan had to try every key.
+    samples = [
+        "thanks so much!",
+        "what should i cook for dinner tonight",
+        "call john back",
+        "pick up milk",
+        "what time is it",
+    ]
+    assert all(_linear_resolve(s) is None and resolve_tz(s) is None for s in samples)
+    n = 2000
+    timings = {
+        name: min(timeit.repeat(lambda: [fn(s) for s in samples], number=n, repeat=3)) / (n * len(samples))
+        for name, fn in (("linear", _linear_resolve), ("trie", resolve_tz))
+    }
+    print({name: f"{secs * 1e6:.2f} us/lookup" for name, secs in timings.items()})
+    assert timings["trie"] < timings["linear"]